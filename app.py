@@ -1,47 +1,37 @@
 import os
-import re
 import io
 import json
+import base64
+import time
+import hashlib
 import logging
 from io import BytesIO
 
-import fitz  # PyMuPDF
 import psycopg2
-import requests
 from flask import Flask, request, jsonify, send_file, render_template_string
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from fpdf import FPDF
-from datetime import timezone
+from datetime import date, datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
-
-# ==== ReportLab for PDF Generation ====
-from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Table,
-    TableStyle, Image, HRFlowable, PageBreak
-)
-from reportlab.lib.utils import ImageReader
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.colors import HexColor
-from reportlab.lib.units import inch
-from reportlab.pdfgen.canvas import Canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from urllib.parse import urlparse
 
 # ==== Local Module ====
-from insight_db import init_db, log_upload, get_insight, get_submission_detail
-
-
-pdfmetrics.registerFont(TTFont("ArialNova", "static/fonts/ArialNova.ttf"))
-pdfmetrics.registerFont(TTFont("ArialNova-Bold", "static/fonts/ArialNova-Bold.ttf"))
-
-pdfmetrics.registerFontFamily(
-    'ArialNova',
-    normal='ArialNova',
-    bold='ArialNova-Bold'
+from insight_db import (
+    init_db, log_upload, get_insight, get_submission_detail, search_submissions, update_submission_sdg,
+    start_sdg_sweeper
 )
+from report import get_renderer, renderer_snapshot, discard_report, ReportQueueFull, ReportTimeout
+from pipeline import process_single_pdf, detected_sdgs, classify_with_aurora, aurora_latency, aurora_metrics
+import sandbox
+from sandbox import get_text_extractor
+from cache import cache
+from webhooks import (
+    create_delivery, get_delivery, submit_delivery, start_webhook_dispatcher,
+    verify_request, callback_allowed, file_url_allowed,
+    WEBHOOK_DEFAULT_CALLBACK_URL, WEBHOOK_MAX_DOWNLOAD_BYTES
+)
+
 
 DB_CONFIG = {
     "host": os.getenv("PGHOST"),
@@ -63,140 +53,55 @@ log.setLevel(logging.DEBUG)
 app = Flask(__name__)
 CORS(app, expose_headers=["Content-Disposition"])
 UPLOAD_FOLDER = "uploads"
+# Batas waktu /extract-abstract; lewat dari ini hasil SDG dikembalikan sebagai "pending"
+EXTRACT_DEADLINE = float(os.getenv("EXTRACT_DEADLINE", "25"))
 init_db()
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# None bila EXTRACT_SANDBOX tidak aktif; worker sandbox dibuat sekali saat start
+text_extractor = get_text_extractor()
+# Pool render report dibuat sebelum request pertama masuk
+get_renderer()
+start_webhook_dispatcher(UPLOAD_FOLDER)
 
-# ------------------ UTILITAS PDF ------------------
-
-def remove_illegal_chars(text):
-    return re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', "", text)
-
-def extract_text_with_fitz(pdf_path):
-    with fitz.open(pdf_path) as doc:
-        return "\n".join(page.get_text("text") for page in doc)
-
-def extract_text_from_pdf(pdf_path):
-    text = extract_text_with_fitz(pdf_path)
-    return remove_illegal_chars(text)
 
-def draw_header(canvas, doc):
-    logo_path = "uploads/LOGO_SC.jpg"
-    logo_width = 2.8 * inch  
-    logo_height = logo_width * (0.55 / 2.2)  #rasio
+def reclassify_pending_sdg(abstract):
+    # Dipakai sweeper untuk baris sdg_pending yang callback-nya hilang
+    outcome = classify_with_aurora(abstract)
+    if not outcome["scores"]:
+        return None
+    return detected_sdgs(outcome["scores"]), outcome["scores"], outcome["model"]
 
-    page_width, page_height = A4
-    x = (page_width - logo_width) / 2
-    y = page_height - logo_height - 0.2 * inch
 
-    canvas.drawImage(logo_path, x, y, width=logo_width, height=logo_height, preserveAspectRatio=True)
-
-    text = "SDG Mapping and Assessment Report"
-    canvas.setFont("ArialNova-Bold", 20)  
-    text_width = canvas.stringWidth(text, "ArialNova-Bold", 20)
-    x = (page_width - text_width) / 2
-    y = page_height - 1.5 * inch
-
-    canvas.drawString(x, y, text)
-
-
-
-def draw_footer(canvas, doc):
-    footer_path = "uploads/footer.png"
-    footer_width = doc.pagesize[0]
-    footer_height = 0.9 * inch  
-
-    x = 0
-    y = 0  
-
-    canvas.drawImage(footer_path, x, y, width=footer_width, height=footer_height, preserveAspectRatio=True, mask='auto')
-
-def draw_first_page(canvas, doc):
-    draw_header(canvas, doc)
-    draw_footer(canvas, doc)
+start_sdg_sweeper(reclassify_pending_sdg)
 
+# ------------------ ROUTES ------------------
 
-def extract_abstract(text):
-    abstract_match = re.search(r"(?i)\bA\s*B\s*S\s*T\s*R\s*A\s*C\s*T\b", text)
-    stop_heading_pattern = (
-        r"(?im)^("
-        r"(Keywords|Kata\s*Kunci)\s*[:\-]?\s*(.*)?$|"
-        r"(Introduction|Latar\s*Belakang|Chapter\s*1|Bab\s*1|"
-        r"(?:Chapter|Bab)?\s*(?:1|I)\.?\s+(?:Introduction|Latar\s*Belakang)|"
-        r"Notation|Background)"
-        r")\s*[:\-]?\s*$"
-    )
+@app.route("/", methods=["GET"])
+def index():
+    return "✅ API is running. Use /extract-abstract or /forminator-webhook."
 
-    if abstract_match:
-        abstract_start = abstract_match.end()
-        stop_after_abstract = re.search(stop_heading_pattern, text[abstract_start:])
-        if stop_after_abstract:
-            abstract_end = abstract_start + stop_after_abstract.start()
-            return text[abstract_start:abstract_end].strip()
-        else:
-            return " ".join(text[abstract_start:].split()[:300])
-    else:
-        stop_match = re.search(stop_heading_pattern, text)
-        if stop_match:
-            pre = text[:stop_match.start()].rstrip()
-            paras = list(re.finditer(r'\n\s*\n', pre))
-            if paras:
-                return pre[paras[-1].end():].strip()
-            else:
-                return " ".join(pre.split()[-300:])
-        else:
-            return " ".join(text.split()[:300])
-
-def classify_with_aurora(abstract):
-    url = "https://aurora-sdg.labs.vu.nl/classifier/classify/elsevier-sdg-multi"
-    headers = {"Content-Type": "application/json"}
-    payload = json.dumps({"text": abstract})
 
+def complete_pending_sdg(submission_id, sdg_future):
     try:
-        response = requests.post(url, headers=headers, data=payload)
-        if response.status_code == 200:
-            predictions = response.json().get("predictions", [])
-
-            all_sdg_scores = {
-                p["sdg"]["label"]: round(p["prediction"] * 100, 2)
-                for p in predictions
-            }
-
-            # Logging top N atau semua
-            logging.info("✅ SDG Classification (All):")
-            for label, score in sorted(all_sdg_scores.items(), key=lambda x: x[1], reverse=True):
-                logging.info(f"- {label}: {score}%")
-
-            return all_sdg_scores  # ← dikembalikan dalam format dict langsung
-        else:
-            logging.error(f"❌ Gagal panggil API Aurora: {response.status_code}")
-            return {}
+        outcome = sdg_future.result()
+        update_submission_sdg(submission_id, detected_sdgs(outcome["scores"]), outcome["scores"], outcome["model"])
+        logging.info(f"✅ Hasil SDG susulan untuk submission {submission_id} tersimpan")
     except Exception as e:
-        logging.error(f"❌ Error saat memanggil API Aurora: {str(e)}")
-        return {}
+        logging.error(f"❌ Gagal menyimpan hasil SDG susulan untuk submission {submission_id}: {str(e)}")
 
 
-def process_single_pdf(pdf_path):
+def request_deadline():
+    # Klien boleh meminta deadline lebih pendek (detik), tidak lebih panjang dari EXTRACT_DEADLINE
     try:
-        full_text = extract_text_from_pdf(pdf_path)
-        abstract = extract_abstract(full_text)
-        sdg_result = classify_with_aurora(abstract)
-        return {
-            "status": "success",
-            "abstract": abstract,
-            "sdg": sdg_result
-        }
-    except Exception as e:
-        logging.error(f"❌ Error di process_single_pdf: {str(e)}")
-        return {"status": "error", "message": str(e)}
+        requested = float(request.values.get("deadline", EXTRACT_DEADLINE))
+    except ValueError:
+        requested = EXTRACT_DEADLINE
+    return time.monotonic() + max(0.0, min(requested, EXTRACT_DEADLINE))
 
-# ------------------ ROUTES ------------------
-
-@app.route("/", methods=["GET"])
-def index():
-    return "✅ API is running. Use /extract-abstract or /forminator-webhook."
 
 @app.route("/extract-abstract", methods=["POST"])
 def extract_abstract_api():
+    deadline = request_deadline()
     if "file" not in request.files:
         return jsonify({"status": "error", "message": "No file uploaded."}), 400
 
@@ -207,20 +112,206 @@ def extract_abstract_api():
     filename = secure_filename(file.filename)
     file_path = os.path.join(UPLOAD_FOLDER, filename)
     file.save(file_path)
-    result = process_single_pdf(file_path)
+    result = process_single_pdf(file_path, deadline=deadline, extract_text=text_extractor)
+    sdg_future = result.pop("sdg_future", None)
 
     sdg_list = []
-    if result.get("status") == "success":
-        sdg_scores = result.get("sdg", {})
-        sdg_list = [int(sdg.replace("Goal ", "")) for sdg, score in sdg_scores.items() if score > 30]
-
-    submission_id = log_upload(filename, request.remote_addr, sdg_list)
+    if result.get("status") == "success" and sdg_future is None:
+        sdg_list = detected_sdgs(result.get("sdg", {}))
+
+    submission_id = log_upload(
+        filename, request.remote_addr, sdg_list,
+        abstract=result.get("abstract"),
+        sdg_scores=None if sdg_future else result.get("sdg"),
+        sdg_pending=sdg_future is not None,
+        sdg_model=result.get("sdg_model")
+    )
+    if sdg_future is not None:
+        sdg_future.add_done_callback(lambda f: complete_pending_sdg(submission_id, f))
 
     os.remove(file_path)
     result["submission_id"] = submission_id
     return jsonify(result)
 
 
+@app.route("/submission/<int:submission_id>", methods=["GET"])
+def submission_status(submission_id):
+    record = get_submission_detail(submission_id)
+    if not record:
+        return jsonify({"status": "error", "message": "Submission ID not found"}), 404
+    return jsonify({
+        "status": "success",
+        "submission_id": submission_id,
+        "sdg": "pending" if record["sdg_pending"] else (record["sdg_scores"] or {}),
+        "sdg_detected": record["sdg"] or [],
+        "sdg_model": record["sdg_model"]
+    })
+
+
+# ------------------ WEBHOOK ------------------
+
+def delivery_response(delivery):
+    body = {
+        "status": delivery["status"],
+        "idempotency_key": delivery["idempotency_key"],
+        "delivery_id": delivery["id"],
+        "submission_id": delivery["submission_id"],
+    }
+    if delivery["result"] is not None:
+        body["result"] = delivery["result"]
+    if delivery["last_error"]:
+        body["last_error"] = delivery["last_error"]
+    return body
+
+
+@app.route("/forminator-webhook", methods=["POST"])
+def forminator_webhook():
+    if (request.content_length or 0) > WEBHOOK_MAX_DOWNLOAD_BYTES:
+        return jsonify({"status": "error", "message": "Request body too large."}), 413
+    # Body mentah di-cache dulu supaya tanda tangan dihitung atas byte yang sama dengan yang diparse
+    if not verify_request(request.get_data(cache=True), request.headers):
+        return jsonify({"status": "error", "message": "Invalid or missing webhook signature."}), 401
+
+    data = request.get_json(silent=True) or request.form.to_dict()
+    logging.debug("📥 Received data from Forminator: %s", data)
+
+    upload = request.files.get("file")
+    file_url = data.get("file_url")
+    upload_data = data.get("upload_1")
+    if not file_url and isinstance(upload_data, dict):
+        file_url = upload_data.get("file_url")
+    elif not file_url and isinstance(upload_data, str):
+        file_url = upload_data
+
+    if upload is None and not file_url:
+        return jsonify({"status": "error", "message": "No file or valid file URL provided."}), 400
+    if upload is None and not file_url_allowed(file_url):
+        return jsonify({"status": "error", "message": "File URL host is not allowed."}), 400
+
+    callback_url = data.get("callback_url") or WEBHOOK_DEFAULT_CALLBACK_URL
+    if callback_url and not callback_allowed(callback_url):
+        return jsonify({"status": "error", "message": "Callback URL is not allowed."}), 400
+    file_bytes = upload.read() if upload is not None else None
+
+    # Tanpa key eksplisit, isi kiriman yang sama dianggap sebagai retry
+    idempotency_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+    if not idempotency_key:
+        digest = hashlib.sha256(file_bytes if file_bytes is not None else file_url.encode())
+        digest.update((callback_url or "").encode())
+        idempotency_key = digest.hexdigest()
+
+    existing = get_delivery(idempotency_key)
+    if existing:
+        response = jsonify(delivery_response(existing))
+        response.headers["Idempotent-Replayed"] = "true"
+        return response, 200
+
+    if upload is not None:
+        filename = secure_filename(upload.filename) or "uploaded.pdf"
+    else:
+        filename = secure_filename(os.path.basename(urlparse(file_url).path)) or "uploaded.pdf"
+
+    file_path = None
+    if file_bytes is not None:
+        key_digest = hashlib.sha256(idempotency_key.encode()).hexdigest()[:16]
+        file_path = os.path.join(UPLOAD_FOLDER, f"webhook_{key_digest}_{filename}")
+
+    delivery = create_delivery(idempotency_key, filename, file_url, file_path, request.remote_addr, callback_url)
+    if delivery is None:
+        # Kalah balapan dengan request lain yang membawa key yang sama
+        response = jsonify(delivery_response(get_delivery(idempotency_key)))
+        response.headers["Idempotent-Replayed"] = "true"
+        return response, 200
+
+    # File baru ditulis setelah baris delivery menjadi milik request ini
+    if file_path:
+        with open(file_path, "wb") as f:
+            f.write(file_bytes)
+
+    submit_delivery(delivery, UPLOAD_FOLDER)
+    return jsonify(delivery_response(delivery)), 202
+
+
+@app.route("/forminator-webhook/<idempotency_key>", methods=["GET"])
+def forminator_webhook_status(idempotency_key):
+    if not verify_request(request.get_data(cache=True), request.headers):
+        return jsonify({"status": "error", "message": "Invalid or missing webhook signature."}), 401
+    delivery = get_delivery(idempotency_key)
+    if not delivery:
+        return jsonify({"status": "error", "message": "Delivery not found"}), 404
+    return jsonify(delivery_response(delivery))
+
+
+# ------------------ SEARCH ------------------
+
+SEARCH_MAX_LIMIT = 100
+
+
+def encode_search_cursor(after):
+    upload_time, submission_id = after
+    raw = json.dumps([upload_time.isoformat(), submission_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_search_cursor(token):
+    upload_time, submission_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    return datetime.fromisoformat(upload_time), int(submission_id)
+
+
+def parse_search_date(value, end=False):
+    # Tanggal tanpa zona waktu dianggap waktu Jakarta, sama seperti tampilan dashboard.
+    # Batas akhir berupa tanggal saja (to=2025-12-31) mencakup seluruh hari itu
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=ZoneInfo("Asia/Jakarta"))
+    if end and len(value) == len(date.min.isoformat()):
+        parsed += timedelta(days=1)
+    return parsed
+
+
+@app.route("/search", methods=["GET"])
+def search_api():
+    # from: inklusif. to: eksklusif bila berisi jam (to=2026-01-01T00:00), sedangkan tanggal saja
+    # inklusif sampai akhir hari, jadi from=2025-01-01&to=2025-12-31 mencakup seluruh tahun 2025
+    args = request.args
+    try:
+        sdg = sorted({
+            int(part.strip().replace("Goal ", ""))
+            for value in args.getlist("sdg")
+            for part in value.split(",") if part.strip()
+        })
+        if any(goal < 1 or goal > 17 for goal in sdg):
+            raise ValueError("sdg must be between 1 and 17")
+
+        match = args.get("match", "any")
+        if match not in ("any", "all"):
+            raise ValueError("match must be 'any' or 'all'")
+
+        min_score = float(args["min_score"]) if args.get("min_score") else None
+        date_from = parse_search_date(args["from"]) if args.get("from") else None
+        date_to = parse_search_date(args["to"], end=True) if args.get("to") else None
+        limit = min(max(int(args.get("limit", 20)), 1), SEARCH_MAX_LIMIT)
+        after = decode_search_cursor(args["cursor"]) if args.get("cursor") else None
+    except (ValueError, TypeError) as e:
+        return jsonify({"status": "error", "message": f"Invalid search parameter: {str(e)}"}), 400
+
+    results, next_after = search_submissions(
+        sdg=sdg, match=match, min_score=min_score,
+        date_from=date_from, date_to=date_to,
+        filename=args.get("filename"), query=args.get("q"),
+        after=after, limit=limit
+    )
+
+    for item in results:
+        item["created_at"] = item["created_at"].astimezone(ZoneInfo("Asia/Jakarta")).isoformat()
+
+    return jsonify({
+        "status": "success",
+        "results": results,
+        "next_cursor": encode_search_cursor(next_after) if next_after else None
+    })
+
+
 @app.route("/admin", methods=["GET"])
 def admin_dashboard():
     total, last_upload, recent = get_insight()
@@ -330,152 +421,50 @@ def download_result():
     # Ambil dari frontend tetap:
     abstract = data.get("abstract", "")
     sdg_scores = data.get("sdg", {})
-
-    # Prepare PDF in memory
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            topMargin=1* inch  # atur agar isi tidak nabrak header
+    if not isinstance(sdg_scores, dict):
+        # Frontend masih memegang "pending"; pakai hasil susulan yang sudah tersimpan
+        sdg_scores = record.get("sdg_scores") or {}
+
+    report_args = (submission_id_str, submission_date_str, filename, sdg_ids, abstract, sdg_scores)
+    download_name = f"{filename}_sdg_report.pdf"
+
+    cached_pdf = cache.get("report", report_args)
+    if cached_pdf is not None:
+        return send_file(
+            BytesIO(cached_pdf),
+            as_attachment=True,
+            download_name=download_name,
+            mimetype="application/pdf"
         )
-    doc.title = "SMART SDG Classifier"
-    doc.author = "https://super.universitaspertamina.ac.id/index.php/smart/"
-    styles = getSampleStyleSheet()
-
-    normal_style = styles["Normal"]
-    normal_style.fontName = "ArialNova"
-    normal_style.spaceAfter = 12
-
-    justified_style = ParagraphStyle(
-        name="Justified",
-        parent=normal_style,
-        alignment=TA_JUSTIFY,
-        fontSize=11,
-        fontName="ArialNova"
-    )
-
-    heading_style = ParagraphStyle(
-        name="Heading",
-        fontSize=14,
-        leading=16,
-        fontName="ArialNova-Bold",
-        textColor=HexColor("#31572C"),
-        alignment=TA_LEFT,
-        spaceBefore=12,
-        spaceAfter=6
-    )
 
-    elements = []
-    SDG_NAMES = {
-        1: "No Poverty",
-        2: "Zero Hunger",
-        3: "Good Health and Well-being",
-        4: "Quality Education",
-        5: "Gender Equality",
-        6: "Clean Water and Sanitation",
-        7: "Affordable and Clean Energy",
-        8: "Decent Work and Economic Growth",
-        9: "Industry, Innovation and Infrastructure",
-        10: "Reduced Inequalities",
-        11: "Sustainable Cities and Communities",
-        12: "Responsible Consumption and Production",
-        13: "Climate Action",
-        14: "Life Below Water",
-        15: "Life on Land",
-        16: "Peace, Justice and Strong Institutions",
-        17: "Partnerships for the Goals"
-    }
-
-    # Title
-    elements.append(Spacer(1, 42))
-
-    # General Notes
-    elements.append(Paragraph("General Notes", heading_style))
-    notes = """
-    This application performs Sustainable Development Goal (SDG) classification based on the abstract extracted from a PDF document.
-    The document is parsed using the fitz library (PyMuPDF), which allows structured reading and text extraction.<br/><br/>
-    The application first attempts to detect and extract the abstract section from the PDF. If an abstract is not detected, 
-    the fallback mechanism extracts the first 500 words from the document as a proxy for the abstract.<br/><br/>
-    The extracted text is then analyzed using the Aurora SDG multi-label mBERT model (https://aurora-sdg.labs.vu.nl/sdg-classifier/text). 
-    This model performs multi-label classification across all 17 Sustainable Development Goals (SDGs).<br/><br/>
-    The output consists of percentage scores (ranging from 0% to 100%) for each SDG, indicating the degree of relevance between the input text and each goal. 
-    Multiple SDGs can be associated with a single document depending on the model’s confidence levels.<br/><br/>
-    This abstract-based analysis enables efficient and scalable SDG classification.
-    """
-    elements.append(Paragraph(notes, justified_style))
-    elements.append(Spacer(1, 18))
-    divider_path = "uploads/divider.png"
-    img_reader = ImageReader(divider_path)
-    orig_width, orig_height = img_reader.getSize()
-
-    # Hitung ukuran baru agar lebarnya sesuai dengan lebar halaman dikurangi margin
-    margin = 1 * inch  # margin kiri + kanan = 2 inch
-    available_width = doc.pagesize[0] - margin
-
-    # Hitung rasio dan sesuaikan tinggi
-    scale = available_width / orig_width
-    new_width = available_width
-    new_height = orig_height * scale
-
-    divider = Image(divider_path, width=new_width, height=new_height)
-
-    elements.append(divider)
-    elements.append(Spacer(1, 16))
-
-    elements.append(Paragraph(
-        f"<b>Submission ID:</b> <font color='#0000FF'>{submission_id_str}</font>", justified_style))
-    elements.append(Paragraph(
-        f"<b>Submission Date:</b> <font color='#0000FF'>{submission_date_str}</font>", justified_style))
-    elements.append(Paragraph(
-        f"<b>File Name:</b> <font color='#0000FF'>{filename}</font>", justified_style))
-    
-    if not sdg_ids:
-        elements.append(Paragraph("<b>SDG Detected:</b> <font color='#0000FF'>None</font>", justified_style))
-    else:
-        sdg_texts = [f"Goal {sid} – {SDG_NAMES.get(sid, 'Unknown')}" for sid in sdg_ids]
-        sdg_line = "; ".join(sdg_texts)
-        elements.append(Paragraph(f"<b>SDG Detected:</b> <font color='#0000FF'>{sdg_line}</font>", justified_style))
-
-    elements.append(Spacer(1, 18))
-
-    elements.append(PageBreak())
-
-
-    # Abstract
-    elements.append(Paragraph("Detected Abstract", heading_style))
-    elements.append(Paragraph(abstract, justified_style))
-    elements.append(Spacer(1, 18))
-
-    # SDG Classification Results
-    elements.append(Paragraph("SDG Classification Results", heading_style))
-
-    sorted_scores = sorted(sdg_scores.items(), key=lambda x: x[1], reverse=True)
-    table_data = [["SDG", "Relevance (%)"]] + [[k, f"{v:.2f}%"] for k, v in sorted_scores]
-
-    table = Table(table_data, colWidths=[3*inch, 2*inch])
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), HexColor("#31572C")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), HexColor("#FFFFFF")),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
-        ("FONTSIZE", (0, 0), (-1, -1), 10),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 6),
-        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [HexColor("#F5F5F5"), HexColor("#FFFFFF")]),
-        ("GRID", (0, 0), (-1, -1), 0.5, HexColor("#CCCCCC"))
-    ]))
-
-    elements.append(table)
+    try:
+        report_path = get_renderer().render(*report_args)
+    except ReportQueueFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+    except ReportTimeout as e:
+        return jsonify({"status": "error", "message": str(e)}), 504
 
-    # Build and send PDF
-    doc.build(elements, onFirstPage=draw_first_page, onLaterPages=draw_footer)
-    buffer.seek(0)
+    with open(report_path, "rb") as f:
+        cache.set("report", report_args, f.read())
 
-    return send_file(
-        buffer,
+    response = send_file(
+        report_path,
         as_attachment=True,
-        download_name=f"{filename}_sdg_report.pdf",
+        download_name=download_name,
         mimetype="application/pdf"
     )
+    response.call_on_close(lambda: discard_report(report_path))
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "report": renderer_snapshot(),
+        "aurora": {**aurora_metrics, "p95_seconds": aurora_latency.p95()},
+        "extraction": sandbox.sandbox.snapshot() if sandbox.sandbox else None,
+        "cache": cache.stats()
+    })
 
 # ------------------ RUN ------------------
 
@@ -0,0 +1,85 @@
+import os
+import time
+import argparse
+import statistics
+from io import BytesIO
+
+import report
+
+
+SAMPLE_ABSTRACT = (
+    "This study evaluates the deployment of rooftop solar photovoltaic systems in urban households "
+    "and their contribution to reducing greenhouse gas emissions. Using monitoring data from 120 "
+    "installations, we estimate energy savings, grid feed-in and avoided emissions over three years. "
+) * 4
+
+SAMPLE_SCORES = {f"Goal {goal}": round((goal * 37) % 100 * 0.9, 2) for goal in report.SDG_NAMES}
+SAMPLE_SCORES.update({"Goal 7": 91.4, "Goal 11": 64.2, "Goal 13": 78.9})
+SAMPLE_SDG_IDS = [7, 11, 13]
+
+
+def render(visuals):
+    output = BytesIO()
+    start = time.perf_counter()
+    report.build_report(
+        output, "00001", "2025-01-01 08:00:00", "sample_paper",
+        SAMPLE_SDG_IDS, SAMPLE_ABSTRACT, SAMPLE_SCORES, visuals=visuals
+    )
+    return time.perf_counter() - start, len(output.getvalue())
+
+
+def raw_sdg_icon(goal):
+    # Pembanding tanpa cache: JPG asli dibaca dan di-embed apa adanya di setiap render
+    with open(os.path.join(report.SDG_ICON_DIR, f"E_SDG_Icons-{goal:02d}.jpg"), "rb") as f:
+        return f.read()
+
+
+def run(label, visuals, rounds, baseline=None):
+    timings, sizes = [], []
+    for _ in range(rounds):
+        elapsed, size = render(visuals)
+        timings.append(elapsed)
+        sizes.append(size)
+    timings.sort()
+    mean = statistics.mean(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    line = (f"{label:<28} mean {mean * 1000:7.1f} ms   "
+            f"p95 {p95 * 1000:7.1f} ms   size {sizes[-1] / 1024:7.1f} KB")
+    if baseline:
+        base_mean, base_size = baseline
+        line += (f"   vs text only {(mean / base_mean - 1) * 100:+6.1f}% time, "
+                 f"{(sizes[-1] - base_size) / 1024:+7.1f} KB")
+    print(line)
+    return mean, sizes[-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SDG report rendering")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    raw_icons = sum(
+        os.path.getsize(os.path.join(report.SDG_ICON_DIR, f"E_SDG_Icons-{goal:02d}.jpg"))
+        for goal in report.SDG_NAMES
+    )
+    start = time.perf_counter()
+    report.warm_icon_cache()
+    warm_time = time.perf_counter() - start
+    cached_icons = sum(len(report.get_sdg_icon(goal)) for goal in report.SDG_NAMES)
+
+    print(f"icon cache warm-up          {warm_time * 1000:7.1f} ms (once per process)")
+    print(f"icons on disk               {raw_icons / 1024:7.1f} KB")
+    print(f"icons pre-scaled            {cached_icons / 1024:7.1f} KB @ {report.SDG_ICON_DPI} dpi")
+
+    # Render pertama memanaskan font dan modul ReportLab, tidak ikut diukur
+    render(True)
+    baseline = run("text only", False, args.rounds)
+    run("icons + chart (cached)", True, args.rounds, baseline)
+
+    cached_get_sdg_icon = report.get_sdg_icon
+    report.get_sdg_icon = raw_sdg_icon
+    try:
+        render(True)
+        run("icons + chart (raw JPG)", True, args.rounds, baseline)
+    finally:
+        report.get_sdg_icon = cached_get_sdg_icon
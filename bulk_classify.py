@@ -0,0 +1,219 @@
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import logging
+import argparse
+from multiprocessing import Pool
+
+from pipeline import extract_text_from_pdf, extract_abstract, classify_with_aurora, detected_sdgs
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+CSV_FIELDS = ["path", "sha256", "filename", "status", "sdg", "sdg_scores", "sdg_model", "abstract", "message"]
+DB_BATCH_SIZE = 500
+
+# Diisi oleh initializer di tiap worker
+_finished_hashes = set()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_pdfs(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(dirpath, name)
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def _init_worker(finished_hashes):
+    global _finished_hashes
+    _finished_hashes = finished_hashes
+    # Log per-file dari pipeline terlalu ramai untuk ribuan dokumen
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def classify_file(path):
+    record = {"path": path, "filename": os.path.basename(path), "size": 0}
+    try:
+        record["size"] = os.path.getsize(path)
+        record["sha256"] = file_sha256(path)
+        if record["sha256"] in _finished_hashes:
+            record["status"] = "skipped"
+            return record
+
+        abstract = extract_abstract(extract_text_from_pdf(path))
+        outcome = classify_with_aurora(abstract)
+        sdg_scores = outcome["scores"]
+        record["abstract"] = abstract
+        record["sdg_scores"] = sdg_scores
+        record["sdg_model"] = outcome["model"]
+        record["sdg"] = detected_sdgs(sdg_scores)
+        if sdg_scores:
+            record["status"] = "success"
+        else:
+            # Gagal klasifikasi tidak masuk checkpoint supaya dicoba lagi saat resume
+            record["status"] = "error"
+            record["message"] = "Aurora classification failed"
+    except Exception as e:
+        record["status"] = "error"
+        record["message"] = str(e)
+    return record
+
+
+class ResultWriter:
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        if fmt == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            if is_new:
+                self._csv.writeheader()
+
+    def write(self, record):
+        if self.fmt == "csv":
+            row = dict(record)
+            row["sdg"] = ";".join(str(goal) for goal in record.get("sdg", []))
+            row["sdg_scores"] = json.dumps(record.get("sdg_scores", {}))
+            self._csv.writerow(row)
+        else:
+            out = {k: v for k, v in record.items() if k != "size"}
+            self._file.write(json.dumps(out, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def mark_finished(checkpoint, hashes):
+    # Checkpoint ditulis setelah hasil tersimpan, jadi crash paling buruk hanya mengulang sebagian file
+    checkpoint.writelines(h + "\n" for h in hashes)
+    checkpoint.flush()
+    hashes.clear()
+
+
+def flush_db_rows(rows, records, hashes, writer, checkpoint):
+    # Hasil baru ditulis ke output setelah batch DB ter-commit, lalu langsung di-checkpoint,
+    # supaya resume setelah crash tidak menulis baris output yang sama dua kali
+    from insight_db import bulk_log_uploads
+
+    if rows:
+        bulk_log_uploads(rows)
+        rows.clear()
+    for record in records:
+        writer.write(record)
+    records.clear()
+    mark_finished(checkpoint, hashes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a directory tree of PDFs against the 17 SDGs")
+    parser.add_argument("directory", help="root directory to scan for *.pdf")
+    parser.add_argument("-o", "--output", default="sdg_results.jsonl", help="output file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="output format, defaults to the output extension")
+    parser.add_argument("--checkpoint", default=None,
+                        help="file recording finished sha256 hashes (default: <output>.done)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--load-db", action="store_true", help="also insert successful results into uploads_new; successful results "
+                             f"are written to the output as each {DB_BATCH_SIZE}-row batch commits")
+    parser.add_argument("--ip", default="bulk-cli", help="value stored in the ip column when loading into the DB")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s:%(name)s:%(message)s")
+
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    checkpoint_path = args.checkpoint or f"{args.output}.done"
+    finished = load_checkpoint(checkpoint_path)
+
+    if args.load_db:
+        from insight_db import init_db
+        init_db()
+
+    paths = list(find_pdfs(args.directory))
+    print(f"Found {len(paths)} PDF(s) under {args.directory}, {len(finished)} already in checkpoint",
+          file=sys.stderr)
+
+    writer = ResultWriter(args.output, fmt)
+    counts = {"success": 0, "error": 0, "skipped": 0}
+    processed_bytes = 0
+    db_rows = []
+    db_records = []
+    pending_hashes = []
+    # Checkpoint hanya dibaca saat start; file berisi sama di path lain dalam run ini dilewati di sini
+    seen_hashes = set()
+    start = time.perf_counter()
+
+    progress = tqdm(total=len(paths), unit="pdf") if tqdm else None
+    try:
+        with open(checkpoint_path, "a") as checkpoint, \
+                Pool(args.workers, initializer=_init_worker, initargs=(finished,)) as pool:
+            for done, record in enumerate(pool.imap_unordered(classify_file, paths, chunksize=4), 1):
+                if record["status"] == "success":
+                    if record["sha256"] in seen_hashes:
+                        record["status"] = "skipped"
+                    else:
+                        seen_hashes.add(record["sha256"])
+                counts[record["status"]] += 1
+                if record["status"] != "skipped":
+                    processed_bytes += record["size"]
+
+                if record["status"] == "success":
+                    pending_hashes.append(record["sha256"])
+                    if args.load_db:
+                        db_rows.append((record["filename"], args.ip, record["sdg"],
+                                        record["abstract"], record["sdg_scores"], record["sdg_model"]))
+                        db_records.append(record)
+                        if len(db_rows) >= DB_BATCH_SIZE:
+                            flush_db_rows(db_rows, db_records, pending_hashes, writer, checkpoint)
+                    else:
+                        writer.write(record)
+                        mark_finished(checkpoint, pending_hashes)
+                elif record["status"] == "error":
+                    writer.write(record)
+
+                if progress:
+                    progress.update(1)
+                elif done % 50 == 0 or done == len(paths):
+                    print(f"\r{done}/{len(paths)}", end="", file=sys.stderr, flush=True)
+            if args.load_db:
+                flush_db_rows(db_rows, db_records, pending_hashes, writer, checkpoint)
+    finally:
+        writer.close()
+        if progress:
+            progress.close()
+        elif paths:
+            print(file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    handled = counts["success"] + counts["error"]
+    print(
+        f"Done in {elapsed:.1f}s: {counts['success']} classified, {counts['error']} failed, "
+        f"{counts['skipped']} skipped | {handled / elapsed if elapsed else 0:.2f} pdf/s, "
+        f"{processed_bytes / (1 << 20) / elapsed if elapsed else 0:.2f} MB/s",
+        file=sys.stderr
+    )
+    return 0 if counts["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Backend: memory (per proses), sqlite (berbagi antar proses di satu host), redis (jaringan), none
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "/tmp/smart_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+# Backend memory ada di tiap worker; PDF report membuat batas jumlah entri saja tidak cukup
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "smart")
+CACHE_COMPRESS_MIN_BYTES = 1024
+
+# TTL (detik) per namespace
+NAMESPACE_TTLS = {
+    "aurora": int(os.getenv("CACHE_TTL_AURORA", str(7 * 24 * 3600))),
+    "geo": int(os.getenv("CACHE_TTL_GEO", str(24 * 3600))),
+    "report": int(os.getenv("CACHE_TTL_REPORT", "3600")),
+}
+DEFAULT_TTL = 3600
+
+
+# ------------------ SERIALISASI ------------------
+
+def encode_value(value):
+    # Byte pertama menandai tipe: B = bytes, J = JSON; huruf kecil berarti terkompresi zlib
+    if isinstance(value, (bytes, bytearray)):
+        tag, data = b"B", bytes(value)
+    else:
+        tag, data = b"J", json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+    if len(data) >= CACHE_COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            tag, data = tag.lower(), compressed
+    return tag + data
+
+
+def decode_value(blob):
+    tag, data = blob[:1], blob[1:]
+    if tag in (b"b", b"j"):
+        data = zlib.decompress(data)
+    if tag in (b"B", b"b"):
+        return data
+    return json.loads(data)
+
+
+# ------------------ BACKENDS ------------------
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, blob, ttl):
+        pass
+
+
+class LocalMemoryBackend:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Satu entri tidak boleh mengusir sebagian besar isi cache
+        self.max_entry_bytes = max_bytes // 8
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, blob = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self._bytes -= len(blob)
+                return None
+            self._entries.move_to_end(key)
+            return blob
+
+    def set(self, key, blob, ttl):
+        if len(blob) > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (time.time() + ttl, blob)
+            self._bytes += len(blob)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+class SQLiteBackend:
+    def __init__(self, path=CACHE_SQLITE_PATH, purge_every=500):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # Satu koneksi per thread; WAL agar pembaca dari proses lain tidak terblokir penulis.
+        # Koneksi warisan fork tidak boleh dipakai ulang di proses anak
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key, blob, ttl):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(blob), time.time() + ttl)
+        )
+        with self._writes_lock:
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+
+class DictClient:
+    # Stand-in redis.Redis berbasis dict untuk tes; hanya get/set(ex=) yang dipakai NetworkBackend
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.data = {}
+
+    def get(self, key):
+        entry = self.data.get(key)
+        if entry is None or entry[0] <= self.clock():
+            self.data.pop(key, None)
+            return None
+        return entry[1]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (self.clock() + ex if ex else float("inf"), bytes(value))
+
+
+class NetworkBackend:
+    # client cukup punya get(key) dan set(key, value, ex=ttl), misalnya redis.Redis atau DictClient saat tes
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url=CACHE_URL):
+        import redis
+        return cls(redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, blob, ttl):
+        self.client.set(key, blob, ex=max(1, int(ttl)))
+
+
+# ------------------ CACHE ------------------
+
+class Cache:
+    def __init__(self, backend, ttls=None, prefix=CACHE_KEY_PREFIX):
+        self.backend = backend
+        self.ttls = dict(NAMESPACE_TTLS if ttls is None else ttls)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _key(self, namespace, key):
+        if not isinstance(key, str):
+            key = json.dumps(key, sort_keys=True, separators=(",", ":"), default=str)
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return f"{self.prefix}:{namespace}:{digest}"
+
+    def _count(self, namespace, field):
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "sets": 0, "errors": 0})
+            stats[field] += 1
+
+    def get(self, namespace, key):
+        try:
+            blob = self.backend.get(self._key(namespace, key))
+            value = decode_value(blob) if blob is not None else None
+        except Exception as e:
+            # Cache tidak boleh menjatuhkan request; backend error atau entri rusak dianggap miss
+            self._count(namespace, "errors")
+            logging.warning(f"⚠️ Cache get {namespace} gagal: {str(e)}")
+            blob = value = None
+        if blob is None:
+            self._count(namespace, "misses")
+            return None
+        self._count(namespace, "hits")
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttls.get(namespace, DEFAULT_TTL)
+        try:
+            self.backend.set(self._key(namespace, key), encode_value(value), ttl)
+            self._count(namespace, "sets")
+        except Exception as e:
+            self._count(namespace, "errors")
+            logging.warning(f"⚠️ Cache set {namespace} gagal: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            data = {namespace: dict(stats) for namespace, stats in self._stats.items()}
+        for stats in data.values():
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        # Counter hit/miss disimpan per proses, juga untuk backend sqlite/redis yang dibagi antar worker
+        return {"backend": type(self.backend).__name__, "scope": "process", "pid": os.getpid(), "namespaces": data}
+
+
+def build_cache(backend_name=CACHE_BACKEND):
+    if backend_name == "sqlite":
+        backend = SQLiteBackend()
+    elif backend_name == "redis":
+        backend = NetworkBackend.from_url()
+    elif backend_name == "none":
+        backend = NullBackend()
+    else:
+        backend = LocalMemoryBackend()
+    return Cache(backend)
+
+
+cache = build_cache()
@@ -1,8 +1,19 @@
 import psycopg2
-from datetime import datetime
+from psycopg2.extras import Json, execute_values
+from datetime import datetime, timezone
 import os
+import sys
+import time
+import atexit
+import signal
+import logging
+import threading
+from collections import deque
 import requests
 
+from migrations import migrate, ensure_partitions
+from cache import cache
+
 # Konfigurasi koneksi ke database PostgreSQL dari environment variables
 DB_CONFIG = {
     "host": os.getenv("PGHOST"),
@@ -12,6 +23,29 @@ DB_CONFIG = {
     "password": os.getenv("PGPASSWORD"),
 }
 
+# Write-behind: log_upload hanya menaruh baris di buffer, thread latar belakang yang menulis ke DB
+WRITE_BEHIND = os.getenv("UPLOAD_WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("UPLOAD_WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("UPLOAD_WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))
+WRITE_BEHIND_ID_BLOCK = int(os.getenv("UPLOAD_WRITE_BEHIND_ID_BLOCK", "100"))
+# Batas baris di buffer; lewat dari ini log_upload menulis langsung ke DB
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("UPLOAD_WRITE_BEHIND_MAX_PENDING", str(WRITE_BEHIND_BATCH_SIZE * 50)))
+WRITE_BEHIND_MAX_BACKOFF = float(os.getenv("UPLOAD_WRITE_BEHIND_MAX_BACKOFF", "60"))
+
+# Lookup lokasi ke ip-api: timeout per request dan total waktu lookup per flush (detik)
+GEO_LOOKUP_TIMEOUT = float(os.getenv("GEO_LOOKUP_TIMEOUT", "2"))
+GEO_FLUSH_BUDGET = float(os.getenv("GEO_FLUSH_BUDGET", "5"))
+GEO_NEGATIVE_TTL = 300
+
+# Baris sdg_pending yang hasil susulannya hilang (mis. proses restart sebelum Aurora menjawab)
+# diklasifikasi ulang oleh sweeper setelah RETRY_AFTER dan dilepas setelah GIVE_UP_AFTER (detik)
+SDG_SWEEP_INTERVAL = float(os.getenv("SDG_SWEEP_INTERVAL", "60"))
+SDG_PENDING_RETRY_AFTER = float(os.getenv("SDG_PENDING_RETRY_AFTER", "300"))
+SDG_PENDING_GIVE_UP_AFTER = float(os.getenv("SDG_PENDING_GIVE_UP_AFTER", str(24 * 3600)))
+
+# Proses yang berjalan lama tetap menyiapkan partisi bulan berikutnya (detik)
+PARTITION_CHECK_INTERVAL = float(os.getenv("UPLOADS_PARTITION_CHECK_INTERVAL", str(6 * 3600)))
+
 
 def get_connection():
     return psycopg2.connect(**DB_CONFIG)
@@ -19,62 +53,429 @@ def get_connection():
 
 def init_db():
     with get_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS uploads_new (
-                    id SERIAL PRIMARY KEY,
-                    filename TEXT,
-                    upload_time TIMESTAMP,
-                    ip TEXT,
-                    location TEXT,
-                    sdg INTEGER[]
-                )
-            ''')
-        conn.commit()
+        migrate(conn)
+        ensure_partitions(conn)
+    start_partition_maintenance()
+    if WRITE_BEHIND:
+        start_write_behind()
+
+
+_partition_thread = None
+
+
+def _partition_maintenance_loop():
+    while True:
+        time.sleep(PARTITION_CHECK_INTERVAL)
+        try:
+            with get_connection() as conn:
+                ensure_partitions(conn)
+        except Exception as e:
+            logging.error(f"❌ Pemeliharaan partisi gagal: {str(e)}")
+
+
+def start_partition_maintenance():
+    global _partition_thread
+    if _partition_thread is None and PARTITION_CHECK_INTERVAL > 0:
+        _partition_thread = threading.Thread(
+            target=_partition_maintenance_loop, name="partition-maintenance", daemon=True
+        )
+        _partition_thread.start()
+
+def get_location_from_ip(ip_address, timeout=GEO_LOOKUP_TIMEOUT):
+    cached = cache.get("geo", ip_address)
+    if cached is not None:
+        return cached
 
-def get_location_from_ip(ip_address):
     try:
-        response = requests.get(f"http://ip-api.com/json/{ip_address}")
+        response = requests.get(f"http://ip-api.com/json/{ip_address}", timeout=timeout)
         data = response.json()
         if data["status"] == "success":
-            return {
+            location = {
                 "country": data.get("country"),
                 "region": data.get("regionName"),
                 "city": data.get("city"),
                 "isp": data.get("isp")
             }
+            cache.set("geo", ip_address, location)
+            return location
     except:
         pass
+    # Kegagalan juga di-cache sebentar supaya IP yang sama tidak terus memakan timeout
+    cache.set("geo", ip_address, {}, ttl=GEO_NEGATIVE_TTL)
     return {}
 
 
-def log_upload(filename, ip_address, sdg):
-    location_data = get_location_from_ip(ip_address)
-    location_str = ""
-    if location_data:
-        parts = [location_data.get("city"), location_data.get("region"), location_data.get("country")]
-        location_str = ", ".join([p for p in parts if p])
+def get_location_str(ip_address):
+    return format_location(get_location_from_ip(ip_address))
+
+
+def format_location(location_data):
+    if not location_data:
+        return ""
+    parts = [location_data.get("city"), location_data.get("region"), location_data.get("country")]
+    return ", ".join([p for p in parts if p])
+
+
+# ------------------ WRITE-BEHIND BUFFER ------------------
+
+class UploadBufferFull(Exception):
+    pass
+
+
+class UploadBuffer:
+    def __init__(self, batch_size, flush_interval, id_block,
+                 max_pending=WRITE_BEHIND_MAX_PENDING, max_backoff=WRITE_BEHIND_MAX_BACKOFF):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id_block = id_block
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._id_lock = threading.Lock()
+        self._ids = deque()
+        # Baris yang belum ter-commit, tetap bisa dibaca oleh get_submission_detail
+        self._pending = {}
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="upload-write-behind", daemon=True)
+        self._thread.start()
+
+    def _next_id(self):
+        with self._id_lock:
+            if not self._ids:
+                with get_connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(
+                            "SELECT nextval('uploads_new_id_seq') FROM generate_series(1, %s)",
+                            (self.id_block,)
+                        )
+                        self._ids.extend(row[0] for row in cursor.fetchall())
+                    conn.commit()
+            return self._ids.popleft()
+
+    def add(self, filename, ip_address, sdg, abstract=None, sdg_scores=None, sdg_pending=False, sdg_model=None):
+        with self._lock:
+            # Saat DB tidak bisa ditulis buffer tidak boleh tumbuh tanpa batas
+            if len(self._pending) >= self.max_pending:
+                raise UploadBufferFull(f"{len(self._pending)} uploads waiting for the database")
+        row = {
+            "id": self._next_id(),
+            "filename": filename,
+            "upload_time": datetime.now(timezone.utc),
+            "ip": ip_address,
+            "sdg": sdg,
+            "abstract": abstract,
+            "sdg_scores": sdg_scores,
+            "sdg_pending": sdg_pending,
+            "sdg_model": sdg_model,
+            "version": 0,
+        }
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Upload buffer is closed")
+            self._pending[row["id"]] = row
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+        return row["id"]
+
+    def get(self, submission_id):
+        with self._lock:
+            row = self._pending.get(submission_id)
+            return dict(row) if row else None
+
+    def update(self, submission_id, **fields):
+        with self._lock:
+            row = self._pending.get(submission_id)
+            if row is None:
+                return False
+            row.update(fields)
+            # Versi baru membuat flush yang sedang berjalan tidak membuang baris ini dari buffer
+            row["version"] += 1
+            return True
+
+    def _flush(self):
+        with self._lock:
+            rows = [dict(r) for r in self._pending.values()]
+        if not rows:
+            return True
+
+        # Hanya lokasi yang sudah ada di cache; lookup jaringan dilakukan setelah INSERT
+        locations = {}
+        for row in rows:
+            if row["ip"] not in locations:
+                cached = cache.get("geo", row["ip"])
+                locations[row["ip"]] = format_location(cached) if cached is not None else None
+
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cursor:
+                    execute_values(
+                        cursor,
+                        """
+                        INSERT INTO uploads_new
+                            (id, filename, upload_time, ip, location, sdg, abstract, sdg_scores, sdg_pending,
+                             sdg_model)
+                        VALUES %s
+                        ON CONFLICT (id, upload_time) DO UPDATE SET
+                            sdg = EXCLUDED.sdg,
+                            sdg_scores = EXCLUDED.sdg_scores,
+                            sdg_pending = EXCLUDED.sdg_pending,
+                            sdg_model = EXCLUDED.sdg_model
+                        """,
+                        [
+                            (r["id"], r["filename"], r["upload_time"], r["ip"], locations[r["ip"]] or "", r["sdg"],
+                             r["abstract"], Json(r["sdg_scores"]) if r["sdg_scores"] is not None else None,
+                             r["sdg_pending"], r["sdg_model"])
+                            for r in rows
+                        ],
+                        page_size=self.batch_size
+                    )
+                conn.commit()
+        except Exception as e:
+            logging.error(f"❌ Gagal flush {len(rows)} upload: {str(e)}")
+            return False
+
+        with self._lock:
+            for r in rows:
+                current = self._pending.get(r["id"])
+                if current is not None and current["version"] == r["version"]:
+                    del self._pending[r["id"]]
+            closed = self._closed
+        logging.debug(f"💾 Flush {len(rows)} upload ke database")
+
+        if not closed:
+            missing = {}
+            for r in rows:
+                if locations[r["ip"]] is None:
+                    missing.setdefault(r["ip"], []).append(r["id"])
+            if missing:
+                self._fill_locations(missing)
+        return True
+
+    def _fill_locations(self, ids_by_ip):
+        # Dibatasi GEO_FLUSH_BUDGET; baris yang tidak sempat tetap tanpa lokasi
+        deadline = time.monotonic() + GEO_FLUSH_BUDGET
+        updates = []
+        for ip, ids in ids_by_ip.items():
+            if time.monotonic() >= deadline:
+                break
+            location = get_location_str(ip)
+            if location:
+                updates.append((location, ids))
+        if not updates:
+            return
+
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cursor:
+                    for location, ids in updates:
+                        cursor.execute(
+                            "UPDATE uploads_new SET location = %s WHERE id = ANY(%s) AND location = ''",
+                            (location, ids)
+                        )
+                conn.commit()
+        except Exception as e:
+            logging.warning(f"⚠️ Gagal mengisi lokasi {len(updates)} IP: {str(e)}")
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._lock:
+                if failures:
+                    # Backoff eksponensial; notify dari add() tidak memperpendek jeda ini
+                    delay = min(self.flush_interval * 2 ** failures, self.max_backoff)
+                    self._wakeup.wait_for(lambda: self._closed, timeout=delay)
+                elif not self._closed and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                closed = self._closed
+            failures = 0 if self._flush() else failures + 1
+            if closed:
+                return
+
+    def close(self, retries=3):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join()
+
+        # Thread sudah berhenti; ulangi flush sisa baris bila percobaan terakhir gagal
+        for _ in range(retries):
+            with self._lock:
+                if not self._pending:
+                    return
+            self._flush()
+        with self._lock:
+            if self._pending:
+                logging.error(f"❌ {len(self._pending)} upload tidak tersimpan saat shutdown: {sorted(self._pending)}")
+
+
+upload_buffer = None
+
+
+def start_write_behind():
+    global upload_buffer
+    if upload_buffer is not None:
+        return upload_buffer
+
+    upload_buffer = UploadBuffer(WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_ID_BLOCK)
+    atexit.register(upload_buffer.close)
+
+    # SIGTERM default tidak menjalankan atexit; ubah jadi SystemExit supaya buffer sempat di-flush
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    except ValueError:
+        # Bukan main thread, biarkan handler bawaan server
+        pass
+    return upload_buffer
+
+
+def log_upload(filename, ip_address, sdg, abstract=None, sdg_scores=None, sdg_pending=False, sdg_model=None):
+    if upload_buffer is not None:
+        try:
+            return upload_buffer.add(filename, ip_address, sdg, abstract, sdg_scores, sdg_pending, sdg_model)
+        except UploadBufferFull as e:
+            logging.warning(f"⚠️ Buffer upload penuh, menulis langsung ke database: {str(e)}")
+
+    location_str = get_location_str(ip_address)
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            submission_id = insert_upload(
+                cursor, filename, ip_address, location_str, sdg, abstract, sdg_scores, sdg_pending, sdg_model
+            )
+        conn.commit()
+        return submission_id
+
+
+def insert_upload(cursor, filename, ip_address, location_str, sdg, abstract=None, sdg_scores=None,
+                  sdg_pending=False, sdg_model=None):
+    # Tanpa commit, supaya pemanggil bisa menulis baris lain di transaksi yang sama (mis. webhooks.py)
+    cursor.execute(
+        """
+        INSERT INTO uploads_new
+            (filename, upload_time, ip, location, sdg, abstract, sdg_scores, sdg_pending, sdg_model)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+        """,
+        (filename, datetime.now(timezone.utc), ip_address, location_str, sdg,
+         abstract, Json(sdg_scores) if sdg_scores is not None else None, sdg_pending, sdg_model)
+    )
+    return cursor.fetchone()[0]
+
+
+def update_submission_sdg(submission_id, sdg, sdg_scores, sdg_model=None):
+    # Dipakai saat hasil Aurora datang setelah deadline request
+    if upload_buffer is not None and upload_buffer.update(
+            submission_id, sdg=sdg, sdg_scores=sdg_scores, sdg_pending=False, sdg_model=sdg_model):
+        return
 
     with get_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(
                 """
-                INSERT INTO uploads_new (filename, upload_time, ip, location, sdg)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id
+                UPDATE uploads_new SET sdg = %s, sdg_scores = %s, sdg_model = %s, sdg_pending = FALSE
+                WHERE id = %s
                 """,
-                (filename, datetime.now(), ip_address, location_str, sdg)
+                (sdg, Json(sdg_scores), sdg_model, submission_id)
             )
-            submission_id = cursor.fetchone()[0]
         conn.commit()
-        return submission_id
 
 
+def sweep_pending_sdg(reclassify, limit=20):
+    # reclassify(abstract) -> (sdg, sdg_scores, sdg_model), atau None bila masih gagal.
+    # SKIP LOCKED membagi baris antar worker; kunci ditahan selama klasifikasi ulang
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE uploads_new SET sdg_pending = FALSE
+                WHERE sdg_pending AND upload_time < now() - %s * interval '1 second'
+                """,
+                (SDG_PENDING_GIVE_UP_AFTER,)
+            )
+            if cursor.rowcount:
+                logging.warning(f"⚠️ {cursor.rowcount} submission menyerah menunggu hasil SDG")
+            cursor.execute(
+                """
+                SELECT id, upload_time, abstract FROM uploads_new
+                WHERE sdg_pending AND upload_time < now() - %s * interval '1 second'
+                ORDER BY upload_time
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (SDG_PENDING_RETRY_AFTER, limit)
+            )
+            rows = cursor.fetchall()
+            recovered = 0
+            for submission_id, upload_time, abstract in rows:
+                outcome = reclassify(abstract) if abstract else None
+                if not outcome:
+                    continue
+                sdg, sdg_scores, sdg_model = outcome
+                cursor.execute(
+                    """
+                    UPDATE uploads_new SET sdg = %s, sdg_scores = %s, sdg_model = %s, sdg_pending = FALSE
+                    WHERE id = %s AND upload_time = %s
+                    """,
+                    (sdg, Json(sdg_scores), sdg_model, submission_id, upload_time)
+                )
+                recovered += 1
+        conn.commit()
+    if recovered:
+        logging.info(f"✅ {recovered} hasil SDG susulan dipulihkan oleh sweeper")
+    return recovered
+
+
+_sweeper_thread = None
+
+
+def _sdg_sweep_loop(reclassify):
+    while True:
+        time.sleep(SDG_SWEEP_INTERVAL)
+        try:
+            sweep_pending_sdg(reclassify)
+        except Exception as e:
+            logging.error(f"❌ Sweeper SDG pending gagal: {str(e)}")
+
+
+def start_sdg_sweeper(reclassify):
+    global _sweeper_thread
+    if _sweeper_thread is None and SDG_SWEEP_INTERVAL > 0:
+        _sweeper_thread = threading.Thread(
+            target=_sdg_sweep_loop, args=(reclassify,), name="sdg-pending-sweeper", daemon=True
+        )
+        _sweeper_thread.start()
+
+
+def bulk_log_uploads(rows, page_size=500):
+    # rows: (filename, ip, sdg, abstract, sdg_scores, sdg_model); dipakai oleh bulk_classify.py
+    now = datetime.now(timezone.utc)
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            execute_values(
+                cursor,
+                """
+                INSERT INTO uploads_new (filename, upload_time, ip, location, sdg, abstract, sdg_scores, sdg_model)
+                VALUES %s
+                """,
+                [
+                    (filename, now, ip, "", sdg, abstract, Json(sdg_scores) if sdg_scores else None, sdg_model)
+                    for filename, ip, sdg, abstract, sdg_scores, sdg_model in rows
+                ],
+                page_size=page_size
+            )
+        conn.commit()
+    return len(rows)
+
 
 def get_insight():
     with get_connection() as conn:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*), MAX(upload_time) FROM uploads_new")
+            cursor.execute("SELECT COALESCE(SUM(total), 0), MAX(last_upload) FROM uploads_stats_shards")
             total, latest = cursor.fetchone()
 
             cursor.execute("SELECT filename, upload_time, ip, location, SDG FROM uploads_new ORDER BY upload_time DESC LIMIT 10")
@@ -83,10 +484,23 @@ def get_insight():
     return total, latest, recent
 
 def get_submission_detail(submission_id):
+    if upload_buffer is not None:
+        row = upload_buffer.get(submission_id)
+        if row:
+            return {
+                "id": row["id"],
+                "filename": row["filename"],
+                "created_at": row["upload_time"],
+                "sdg": row["sdg"],
+                "sdg_scores": row["sdg_scores"],
+                "sdg_pending": row["sdg_pending"],
+                "sdg_model": row["sdg_model"]
+            }
+
     with get_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(
-                "SELECT id, filename, upload_time, sdg FROM uploads_new WHERE id = %s",
+                "SELECT id, filename, upload_time, sdg, sdg_scores, sdg_pending, sdg_model FROM uploads_new WHERE id = %s",
                 (submission_id,)
             )
             row = cursor.fetchone()
@@ -95,7 +509,87 @@ def get_submission_detail(submission_id):
                     "id": row[0],
                     "filename": row[1],
                     "created_at": row[2],  # alias upload_time
-                    "sdg": row[3]
+                    "sdg": row[3],
+                    "sdg_scores": row[4],
+                    "sdg_pending": row[5],
+                    "sdg_model": row[6]
                 }
     return None
 
+
+def search_submissions(sdg=None, match="any", min_score=None, date_from=None, date_to=None,
+                       filename=None, query=None, after=None, limit=20):
+    conditions = []
+    params = []
+
+    if sdg:
+        # && / @> memakai GIN index pada kolom sdg
+        conditions.append("sdg @> %s::int[]" if match == "all" else "sdg && %s::int[]")
+        params.append(list(sdg))
+
+    if min_score is not None:
+        if sdg and match == "all":
+            conditions.append(
+                "NOT EXISTS (SELECT 1 FROM unnest(%s::int[]) g "
+                "WHERE COALESCE((sdg_scores->>('Goal ' || g))::numeric, 0) < %s)"
+            )
+            params.extend([list(sdg), min_score])
+        elif sdg:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM unnest(%s::int[]) g "
+                "WHERE (sdg_scores->>('Goal ' || g))::numeric >= %s)"
+            )
+            params.extend([list(sdg), min_score])
+        else:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM jsonb_each_text(sdg_scores) s WHERE s.value::numeric >= %s)"
+            )
+            params.append(min_score)
+
+    if date_from is not None:
+        conditions.append("upload_time >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("upload_time < %s")
+        params.append(date_to)
+
+    if filename:
+        escaped = filename.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("filename ILIKE %s")
+        params.append(f"%{escaped}%")
+
+    if query:
+        conditions.append("to_tsvector('simple', COALESCE(abstract, '')) @@ plainto_tsquery('simple', %s)")
+        params.append(query)
+
+    if after is not None:
+        conditions.append("(upload_time, id) < (%s, %s)")
+        params.extend(after)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id, filename, upload_time, sdg, sdg_scores
+                FROM uploads_new
+                {where}
+                ORDER BY upload_time DESC, id DESC
+                LIMIT %s
+                """,
+                params + [limit + 1]
+            )
+            rows = cursor.fetchall()
+
+    results = [
+        {
+            "id": row[0],
+            "filename": row[1],
+            "created_at": row[2],
+            "sdg": row[3],
+            "sdg_scores": row[4]
+        }
+        for row in rows[:limit]
+    ]
+    next_after = (rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+    return results, next_after
@@ -0,0 +1,409 @@
+import os
+import re
+import logging
+import argparse
+from datetime import datetime, timezone
+
+# Zona waktu yang dipakai server lama saat mengisi upload_time dengan datetime.now()
+LEGACY_UPLOAD_TZ = os.getenv("LEGACY_UPLOAD_TZ", "UTC")
+
+# Berapa bulan ke depan partisi uploads_new disiapkan
+PARTITION_MONTHS_AHEAD = int(os.getenv("UPLOADS_PARTITION_MONTHS_AHEAD", "2"))
+
+# Partisi yang lebih tua dari ini dipindah ke schema arsip oleh retention job
+RETAIN_MONTHS = int(os.getenv("UPLOADS_RETAIN_MONTHS", "24"))
+ARCHIVE_SCHEMA = os.getenv("UPLOADS_ARCHIVE_SCHEMA", "uploads_archive")
+
+# Kunci advisory lock agar beberapa worker tidak menjalankan migrasi bersamaan
+MIGRATION_LOCK_ID = 72_026_001
+
+# Jumlah shard counter uploads_stats_shards; tetap setelah migrasi 0005 diterapkan
+UPLOAD_STATS_SHARDS = 16
+
+PARTITION_NAME_RE = re.compile(r"^uploads_new_y(\d{4})m(\d{2})$")
+
+
+# ------------------ PARTISI ------------------
+
+def _month_start(year, month):
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def _partition_name(month_start):
+    return f"uploads_new_y{month_start.year:04d}m{month_start.month:02d}"
+
+
+def _create_month_partition(cursor, month_start):
+    month_end = _month_start(month_start.year, month_start.month + 1)
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {_partition_name(month_start)}
+        PARTITION OF uploads_new
+        FOR VALUES FROM (%s) TO (%s)
+        """,
+        (month_start, month_end)
+    )
+
+
+def _move_default_rows(cursor, month_start):
+    # Partisi baru ditolak selama partisi default berisi baris di rentangnya, jadi default
+    # dilepas dulu, barisnya dipindah ke partisi bulanan, lalu dipasang kembali
+    name = _partition_name(month_start)
+    month_end = _month_start(month_start.year, month_start.month + 1)
+    cursor.execute("ALTER TABLE uploads_new DETACH PARTITION uploads_new_default")
+    _create_month_partition(cursor, month_start)
+    cursor.execute(
+        f"""
+        INSERT INTO {name}
+        SELECT * FROM uploads_new_default
+        WHERE upload_time >= %s AND upload_time < %s
+        """,
+        (month_start, month_end)
+    )
+    moved = cursor.rowcount
+    cursor.execute(
+        "DELETE FROM uploads_new_default WHERE upload_time >= %s AND upload_time < %s",
+        (month_start, month_end)
+    )
+    cursor.execute("ALTER TABLE uploads_new ATTACH PARTITION uploads_new_default DEFAULT")
+    return moved
+
+
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD):
+    now = datetime.now(timezone.utc)
+    months = {_month_start(now.year, now.month + offset) for offset in range(months_ahead + 1)}
+
+    # Bulan yang barisnya terlanjur masuk ke partisi default (mis. proses lama tidak jalan
+    # melewati jendela partisi). Baris legacy berwaktu epoch dibiarkan di default
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT DISTINCT date_trunc('month', upload_time AT TIME ZONE 'UTC')
+            FROM uploads_new_default
+            WHERE upload_time > 'epoch'
+            """
+        )
+        stranded = {row[0].replace(tzinfo=timezone.utc) for row in cursor.fetchall()}
+    conn.commit()
+
+    for month_start in sorted(months | stranded):
+        try:
+            with conn.cursor() as cursor:
+                if month_start in stranded:
+                    moved = _move_default_rows(cursor, month_start)
+                else:
+                    _create_month_partition(cursor, month_start)
+            conn.commit()
+            if month_start in stranded:
+                logging.info(f"📦 {moved} baris dipindah dari partisi default ke {_partition_name(month_start)}")
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"❌ Gagal membuat partisi {_partition_name(month_start)}: {str(e)}")
+
+
+def archive_old_partitions(conn, retain_months=RETAIN_MONTHS):
+    # Retention job juga menyiapkan partisi ke depan, jadi cron harian cukup menjalankan "archive"
+    ensure_partitions(conn)
+
+    now = datetime.now(timezone.utc)
+    cutoff = _month_start(now.year, now.month - retain_months)
+    archived = []
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'uploads_new'
+            """
+        )
+        partitions = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+
+    for name in sorted(partitions):
+        match = PARTITION_NAME_RE.match(name)
+        if not match:
+            continue
+        month_start = _month_start(int(match.group(1)), int(match.group(2)))
+        if _month_start(month_start.year, month_start.month + 1) > cutoff:
+            continue
+        with conn.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE uploads_new DETACH PARTITION {name}")
+            # Total di dashboard hanya menghitung baris yang masih ada di uploads_new
+            cursor.execute(
+                f"UPDATE uploads_stats_shards SET total = total - (SELECT COUNT(*) FROM {name}) WHERE shard = 0"
+            )
+            cursor.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+        conn.commit()
+        archived.append(name)
+        logging.info(f"📦 Partisi {name} dipindah ke {ARCHIVE_SCHEMA}")
+
+    return archived
+
+
+# ------------------ MIGRASI ------------------
+
+def _0001_create_uploads(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS uploads_new (
+            id SERIAL PRIMARY KEY,
+            filename TEXT,
+            upload_time TIMESTAMP,
+            ip TEXT,
+            location TEXT,
+            sdg INTEGER[]
+        )
+    ''')
+
+
+def _0002_upload_time_timestamptz(cursor):
+    cursor.execute(
+        """
+        ALTER TABLE uploads_new
+        ALTER COLUMN upload_time TYPE TIMESTAMPTZ
+        USING upload_time AT TIME ZONE %s
+        """,
+        (LEGACY_UPLOAD_TZ,)
+    )
+    cursor.execute("ALTER TABLE uploads_new ALTER COLUMN upload_time SET DEFAULT now()")
+
+
+def _0003_upload_indexes(cursor):
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_uploads_new_upload_time ON uploads_new (upload_time DESC)"
+    )
+
+
+def _0004_partition_by_month(cursor):
+    cursor.execute("ALTER TABLE uploads_new RENAME TO uploads_legacy")
+    # Sequence id dipertahankan supaya submission_id lama tetap valid
+    cursor.execute("ALTER SEQUENCE uploads_new_id_seq OWNED BY NONE")
+    cursor.execute('''
+        CREATE TABLE uploads_new (
+            id INTEGER NOT NULL DEFAULT nextval('uploads_new_id_seq'),
+            filename TEXT,
+            upload_time TIMESTAMPTZ NOT NULL DEFAULT now(),
+            ip TEXT,
+            location TEXT,
+            sdg INTEGER[],
+            PRIMARY KEY (id, upload_time)
+        ) PARTITION BY RANGE (upload_time)
+    ''')
+    cursor.execute("CREATE TABLE uploads_new_default PARTITION OF uploads_new DEFAULT")
+
+    cursor.execute(
+        """
+        SELECT DISTINCT date_trunc('month', upload_time AT TIME ZONE 'UTC')
+        FROM uploads_legacy
+        WHERE upload_time IS NOT NULL
+        """
+    )
+    months = {row[0].replace(tzinfo=timezone.utc) for row in cursor.fetchall()}
+    now = datetime.now(timezone.utc)
+    months.update(_month_start(now.year, now.month + i) for i in range(PARTITION_MONTHS_AHEAD + 1))
+    for month_start in sorted(months):
+        _create_month_partition(cursor, month_start)
+
+    # Baris lama tanpa upload_time masuk ke partisi default dengan waktu epoch
+    cursor.execute(
+        """
+        INSERT INTO uploads_new (id, filename, upload_time, ip, location, sdg)
+        SELECT id, filename, COALESCE(upload_time, 'epoch'), ip, location, sdg
+        FROM uploads_legacy
+        """
+    )
+    cursor.execute("DROP TABLE uploads_legacy")
+    cursor.execute("ALTER SEQUENCE uploads_new_id_seq OWNED BY uploads_new.id")
+
+    cursor.execute("CREATE INDEX idx_uploads_new_upload_time ON uploads_new (upload_time DESC)")
+    cursor.execute("CREATE INDEX idx_uploads_new_id ON uploads_new (id)")
+
+
+def _0005_upload_stats(cursor):
+    # Ringkasan untuk dashboard agar tidak perlu COUNT(*) atas seluruh histori. Counter dipecah
+    # per shard (dipilih dari pid backend) supaya INSERT bersamaan tidak antre di satu baris;
+    # dashboard menjumlahkan semua shard
+    cursor.execute('''
+        CREATE TABLE uploads_stats_shards (
+            shard INTEGER PRIMARY KEY,
+            total BIGINT NOT NULL DEFAULT 0,
+            last_upload TIMESTAMPTZ
+        )
+    ''')
+    cursor.execute(
+        "INSERT INTO uploads_stats_shards (shard) SELECT generate_series(0, %s - 1)",
+        (UPLOAD_STATS_SHARDS,)
+    )
+    cursor.execute(
+        """
+        UPDATE uploads_stats_shards SET
+            total = (SELECT COUNT(*) FROM uploads_new),
+            last_upload = (SELECT MAX(upload_time) FROM uploads_new)
+        WHERE shard = 0
+        """
+    )
+    cursor.execute(f'''
+        CREATE FUNCTION uploads_stats_on_insert() RETURNS trigger AS $$
+        BEGIN
+            UPDATE uploads_stats_shards SET
+                total = total + (SELECT COUNT(*) FROM new_rows),
+                last_upload = GREATEST(last_upload, (SELECT MAX(upload_time) FROM new_rows))
+            WHERE shard = pg_backend_pid() % {UPLOAD_STATS_SHARDS};
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_uploads_stats
+        AFTER INSERT ON uploads_new
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION uploads_stats_on_insert()
+    ''')
+
+
+def _0006_search_indexes(cursor):
+    cursor.execute("ALTER TABLE uploads_new ADD COLUMN abstract TEXT")
+    cursor.execute("ALTER TABLE uploads_new ADD COLUMN sdg_scores JSONB")
+
+    cursor.execute("CREATE INDEX idx_uploads_new_sdg ON uploads_new USING GIN (sdg)")
+    # Ekspresi harus sama persis dengan yang dipakai search_submissions
+    cursor.execute(
+        """
+        CREATE INDEX idx_uploads_new_abstract_fts ON uploads_new
+        USING GIN (to_tsvector('simple', COALESCE(abstract, '')))
+        """
+    )
+    # Keyset pagination: ORDER BY upload_time DESC, id DESC
+    cursor.execute("CREATE INDEX idx_uploads_new_time_id ON uploads_new (upload_time DESC, id DESC)")
+
+    # pg_trgm butuh hak CREATE EXTENSION; tanpa itu pencarian filename tetap jalan, hanya lebih lambat
+    cursor.execute("SAVEPOINT trgm")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            "CREATE INDEX idx_uploads_new_filename_trgm ON uploads_new USING GIN (filename gin_trgm_ops)"
+        )
+        cursor.execute("RELEASE SAVEPOINT trgm")
+    except Exception as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT trgm")
+        logging.warning(f"⚠️ pg_trgm tidak tersedia, index filename dilewati: {str(e)}")
+
+
+def _0007_webhook_deliveries(cursor):
+    cursor.execute('''
+        CREATE TABLE webhook_deliveries (
+            id SERIAL PRIMARY KEY,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL,
+            filename TEXT,
+            file_url TEXT,
+            file_path TEXT,
+            ip TEXT,
+            callback_url TEXT,
+            submission_id INTEGER,
+            result JSONB,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            last_error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    ''')
+    # Hanya baris yang masih perlu dikerjakan yang di-scan oleh dispatcher
+    cursor.execute(
+        """
+        CREATE INDEX idx_webhook_deliveries_due ON webhook_deliveries (next_attempt_at)
+        WHERE status IN ('pending', 'delivering')
+        """
+    )
+
+
+def _0008_sdg_pending(cursor):
+    # TRUE selama hasil Aurora belum datang (deadline request terlewati)
+    cursor.execute("ALTER TABLE uploads_new ADD COLUMN sdg_pending BOOLEAN NOT NULL DEFAULT FALSE")
+    # Sweeper hanya membaca baris yang masih menunggu
+    cursor.execute("CREATE INDEX idx_uploads_new_sdg_pending ON uploads_new (upload_time) WHERE sdg_pending")
+
+
+def _0009_sdg_model(cursor):
+    # Model Aurora yang memberi skor; request hedged bisa dijawab model cadangan
+    cursor.execute("ALTER TABLE uploads_new ADD COLUMN sdg_model TEXT")
+
+
+MIGRATIONS = [
+    (1, "create uploads_new", _0001_create_uploads),
+    (2, "upload_time as timestamptz", _0002_upload_time_timestamptz),
+    (3, "index upload_time", _0003_upload_indexes),
+    (4, "partition uploads_new by month", _0004_partition_by_month),
+    (5, "sharded uploads_stats_shards counter", _0005_upload_stats),
+    (6, "abstract, sdg_scores and search indexes", _0006_search_indexes),
+    (7, "webhook_deliveries", _0007_webhook_deliveries),
+    (8, "uploads_new.sdg_pending", _0008_sdg_pending),
+    (9, "uploads_new.sdg_model", _0009_sdg_model),
+]
+
+
+def migrate(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            ''')
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+
+        for version, name, apply in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                with conn.cursor() as cursor:
+                    apply(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                        (version, name)
+                    )
+                conn.commit()
+                logging.info(f"✅ Migrasi {version:04d} ({name}) diterapkan")
+            except Exception:
+                conn.rollback()
+                logging.error(f"❌ Migrasi {version:04d} ({name}) gagal")
+                raise
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+
+# ------------------ CLI ------------------
+
+if __name__ == "__main__":
+    from insight_db import get_connection
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
+
+    parser = argparse.ArgumentParser(description="Schema migrations and retention for uploads_new")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("migrate", help="apply pending migrations")
+    archive = sub.add_parser("archive", help="detach and archive old monthly partitions")
+    archive.add_argument("--retain-months", type=int, default=RETAIN_MONTHS)
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        migrate(conn)
+        if args.command == "archive":
+            archived = archive_old_partitions(conn, args.retain_months)
+            print(f"Archived {len(archived)} partition(s): {', '.join(archived) or '-'}")
+        else:
+            ensure_partitions(conn)
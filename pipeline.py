@@ -0,0 +1,297 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import fitz  # PyMuPDF
+import requests
+
+from cache import cache
+
+# Skor minimal (persen) agar sebuah SDG dianggap terdeteksi
+SDG_THRESHOLD = 30
+
+# Endpoint Aurora; hedged request dikirim ke model cadangan bila request utama lebih lambat dari p95
+AURORA_URL = os.getenv(
+    "AURORA_URL", "https://aurora-sdg.labs.vu.nl/classifier/classify/elsevier-sdg-multi"
+)
+AURORA_HEDGE_URL = os.getenv(
+    "AURORA_HEDGE_URL", "https://aurora-sdg.labs.vu.nl/classifier/classify/aurora-sdg-multi"
+)
+AURORA_TIMEOUT = float(os.getenv("AURORA_TIMEOUT", "60"))
+AURORA_HEDGE_AFTER = float(os.getenv("AURORA_HEDGE_AFTER", "3"))
+AURORA_MAX_CONCURRENCY = int(os.getenv("AURORA_MAX_CONCURRENCY", "16"))
+
+
+# ------------------ UTILITAS PDF ------------------
+
+def remove_illegal_chars(text):
+    return re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', "", text)
+
+class ExtractionError(Exception):
+    def __init__(self, error_type, message, **details):
+        super().__init__(message)
+        self.error = {"type": error_type, "message": message, **details}
+
+
+def extract_text_with_fitz(pdf_path, max_pages=None, max_chars=None):
+    parts = []
+    total = 0
+    with fitz.open(pdf_path) as doc:
+        for page_no, page in enumerate(doc):
+            if max_pages is not None and page_no >= max_pages:
+                logging.warning(f"⚠️ {pdf_path}: berhenti di {max_pages} halaman (budget)")
+                break
+            text = page.get_text("text")
+            if max_chars is not None and total + len(text) > max_chars:
+                parts.append(text[:max_chars - total])
+                logging.warning(f"⚠️ {pdf_path}: teks dipotong di {max_chars} karakter (budget)")
+                break
+            parts.append(text)
+            total += len(text)
+    return "\n".join(parts)
+
+def extract_text_from_pdf(pdf_path, max_pages=None, max_chars=None):
+    text = extract_text_with_fitz(pdf_path, max_pages, max_chars)
+    return remove_illegal_chars(text)
+
+def extract_abstract(text):
+    abstract_match = re.search(r"(?i)\bA\s*B\s*S\s*T\s*R\s*A\s*C\s*T\b", text)
+    stop_heading_pattern = (
+        r"(?im)^("
+        r"(Keywords|Kata\s*Kunci)\s*[:\-]?\s*(.*)?$|"
+        r"(Introduction|Latar\s*Belakang|Chapter\s*1|Bab\s*1|"
+        r"(?:Chapter|Bab)?\s*(?:1|I)\.?\s+(?:Introduction|Latar\s*Belakang)|"
+        r"Notation|Background)"
+        r")\s*[:\-]?\s*$"
+    )
+
+    if abstract_match:
+        abstract_start = abstract_match.end()
+        stop_after_abstract = re.search(stop_heading_pattern, text[abstract_start:])
+        if stop_after_abstract:
+            abstract_end = abstract_start + stop_after_abstract.start()
+            return text[abstract_start:abstract_end].strip()
+        else:
+            return " ".join(text[abstract_start:].split()[:300])
+    else:
+        stop_match = re.search(stop_heading_pattern, text)
+        if stop_match:
+            pre = text[:stop_match.start()].rstrip()
+            paras = list(re.finditer(r'\n\s*\n', pre))
+            if paras:
+                return pre[paras[-1].end():].strip()
+            else:
+                return " ".join(pre.split()[-300:])
+        else:
+            return " ".join(text.split()[:300])
+
+class AuroraError(Exception):
+    pass
+
+
+class LatencyTracker:
+    def __init__(self, window=200, min_samples=20, default=AURORA_HEDGE_AFTER):
+        self.default = default
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        # Sebelum cukup sampel, pakai nilai default dari konfigurasi
+        if len(samples) < self.min_samples:
+            return self.default
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+aurora_latency = LatencyTracker()
+aurora_metrics = {"calls": 0, "errors": 0, "hedged": 0, "hedge_wins": 0, "pending": 0}
+_aurora_executor = ThreadPoolExecutor(max_workers=AURORA_MAX_CONCURRENCY, thread_name_prefix="aurora")
+_metrics_lock = threading.Lock()
+
+
+def aurora_model_name(url):
+    # Nama model Aurora adalah segmen terakhir URL classifier, mis. "elsevier-sdg-multi"
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _count(key):
+    with _metrics_lock:
+        aurora_metrics[key] += 1
+
+
+def remaining_time(deadline):
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def _call_aurora(url, abstract):
+    headers = {"Content-Type": "application/json"}
+    payload = json.dumps({"text": abstract})
+
+    _count("calls")
+    started = time.monotonic()
+    try:
+        response = requests.post(url, headers=headers, data=payload, timeout=AURORA_TIMEOUT)
+    except Exception as e:
+        _count("errors")
+        logging.error(f"❌ Error saat memanggil API Aurora: {str(e)}")
+        raise AuroraError(str(e))
+
+    if response.status_code != 200:
+        _count("errors")
+        logging.error(f"❌ Gagal panggil API Aurora: {response.status_code}")
+        raise AuroraError(f"Aurora returned HTTP {response.status_code}")
+    aurora_latency.record(time.monotonic() - started)
+
+    predictions = response.json().get("predictions", [])
+    all_sdg_scores = {
+        p["sdg"]["label"]: round(p["prediction"] * 100, 2)
+        for p in predictions
+    }
+
+    # Logging top N atau semua
+    logging.info("✅ SDG Classification (All):")
+    for label, score in sorted(all_sdg_scores.items(), key=lambda x: x[1], reverse=True):
+        logging.info(f"- {label}: {score}%")
+
+    return all_sdg_scores
+
+
+class HedgedAuroraCall:
+    # Request utama dikirim dulu; bila belum selesai setelah p95, request cadangan dikirim ke AURORA_HEDGE_URL.
+    # Hasil future: {"model": nama model yang menjawab, "scores": skor per goal}
+    def __init__(self, abstract):
+        self.abstract = abstract
+        self.future = Future()
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._hedged = not AURORA_HEDGE_URL
+        self._settled = False
+        self._timer = None
+
+    def start(self):
+        self._launch(AURORA_URL)
+        if not self._hedged:
+            self._timer = threading.Timer(aurora_latency.p95(), self._hedge)
+            self._timer.daemon = True
+            self._timer.start()
+        return self.future
+
+    def _launch(self, url):
+        with self._lock:
+            self._outstanding += 1
+        call = _aurora_executor.submit(_call_aurora, url, self.abstract)
+        call.add_done_callback(lambda f: self._on_done(url, f))
+
+    def _hedge(self):
+        with self._lock:
+            if self._settled or self._hedged:
+                return
+            self._hedged = True
+        _count("hedged")
+        logging.info(f"⏱️ Aurora melewati p95, kirim hedged request ke {AURORA_HEDGE_URL}")
+        self._launch(AURORA_HEDGE_URL)
+
+    def _on_done(self, url, call):
+        hedge_now = False
+        outcome = None
+        with self._lock:
+            self._outstanding -= 1
+            if self._settled:
+                return
+            if call.exception() is None:
+                outcome = {"model": aurora_model_name(url), "scores": call.result()}
+            elif not self._hedged:
+                # Request utama gagal cepat, langsung coba endpoint cadangan
+                self._hedged = hedge_now = True
+            elif self._outstanding == 0:
+                outcome = {"model": None, "scores": {}}
+            if outcome is not None:
+                self._settled = True
+
+        if hedge_now:
+            _count("hedged")
+            self._launch(AURORA_HEDGE_URL)
+            return
+        if outcome is None:
+            return
+        if self._timer:
+            self._timer.cancel()
+        if outcome["scores"] and url == AURORA_HEDGE_URL:
+            _count("hedge_wins")
+        self.future.set_result(outcome)
+
+
+def _store_aurora_result(abstract, future):
+    # Model ikut disimpan supaya cache hit tetap tahu model mana yang memberi skor
+    outcome = future.result()
+    if outcome["scores"]:
+        cache.set("aurora", abstract, outcome)
+
+
+def classify_with_aurora_async(abstract):
+    cached = cache.get("aurora", abstract)
+    # Entri lama hanya berisi skor tanpa model; dianggap miss
+    if isinstance(cached, dict) and "scores" in cached:
+        future = Future()
+        future.set_result(cached)
+        return future
+
+    future = HedgedAuroraCall(abstract).start()
+    future.add_done_callback(lambda f: _store_aurora_result(abstract, f))
+    return future
+
+
+def classify_with_aurora(abstract, deadline=None):
+    try:
+        return classify_with_aurora_async(abstract).result(timeout=remaining_time(deadline))
+    except FutureTimeoutError:
+        logging.error("❌ Deadline habis saat menunggu API Aurora")
+        return {"model": None, "scores": {}}
+
+
+def process_single_pdf(pdf_path, deadline=None, extract_text=None):
+    try:
+        full_text = (extract_text or extract_text_from_pdf)(pdf_path)
+        abstract = extract_abstract(full_text)
+        sdg_future = classify_with_aurora_async(abstract)
+        try:
+            outcome = sdg_future.result(timeout=remaining_time(deadline))
+        except FutureTimeoutError:
+            # Abstrak tetap dikembalikan; pemanggil mengambil sdg_future untuk mengisi hasil belakangan
+            _count("pending")
+            logging.warning("⏳ Deadline habis, hasil SDG akan menyusul")
+            return {
+                "status": "success",
+                "abstract": abstract,
+                "sdg": "pending",
+                "sdg_future": sdg_future
+            }
+        return {
+            "status": "success",
+            "abstract": abstract,
+            "sdg": outcome["scores"],
+            "sdg_model": outcome["model"]
+        }
+    except ExtractionError as e:
+        logging.error(f"❌ Ekstraksi gagal di process_single_pdf: {e.error}")
+        return {"status": "error", "message": str(e), "error": e.error}
+    except Exception as e:
+        logging.error(f"❌ Error di process_single_pdf: {str(e)}")
+        return {"status": "error", "message": str(e)}
+
+
+def detected_sdgs(sdg_scores):
+    return [int(sdg.replace("Goal ", "")) for sdg, score in sdg_scores.items() if score > SDG_THRESHOLD]
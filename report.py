@@ -0,0 +1,497 @@
+import os
+import time
+import signal
+import logging
+import tempfile
+import threading
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# ==== ReportLab for PDF Generation ====
+from reportlab.platypus import (
+    SimpleDocTemplate, Paragraph, Spacer, Table,
+    TableStyle, Image, PageBreak
+)
+from reportlab.lib.utils import ImageReader
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.colors import HexColor
+from reportlab.lib.units import inch
+from reportlab.graphics.shapes import Drawing
+from reportlab.graphics.charts.barcharts import HorizontalBarChart
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from PIL import Image as PILImage
+
+
+pdfmetrics.registerFont(TTFont("ArialNova", "static/fonts/ArialNova.ttf"))
+pdfmetrics.registerFont(TTFont("ArialNova-Bold", "static/fonts/ArialNova-Bold.ttf"))
+
+pdfmetrics.registerFontFamily(
+    'ArialNova',
+    normal='ArialNova',
+    bold='ArialNova-Bold'
+)
+
+# Konfigurasi process pool untuk render laporan
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "8"))
+REPORT_RENDER_TIMEOUT = float(os.getenv("REPORT_RENDER_TIMEOUT", "30"))
+REPORT_TMP_DIR = os.getenv("REPORT_TMP_DIR") or None
+
+# Ikon SDG diperkecil sekali ke resolusi cetak lalu disimpan di memori
+SDG_ICON_DIR = "sdg-icons"
+SDG_ICON_SIZE = 0.75 * inch
+SDG_ICON_DPI = int(os.getenv("REPORT_ICON_DPI", "150"))
+SDG_ICONS_PER_ROW = 8
+
+SDG_NAMES = {
+    1: "No Poverty",
+    2: "Zero Hunger",
+    3: "Good Health and Well-being",
+    4: "Quality Education",
+    5: "Gender Equality",
+    6: "Clean Water and Sanitation",
+    7: "Affordable and Clean Energy",
+    8: "Decent Work and Economic Growth",
+    9: "Industry, Innovation and Infrastructure",
+    10: "Reduced Inequalities",
+    11: "Sustainable Cities and Communities",
+    12: "Responsible Consumption and Production",
+    13: "Climate Action",
+    14: "Life Below Water",
+    15: "Life on Land",
+    16: "Peace, Justice and Strong Institutions",
+    17: "Partnerships for the Goals"
+}
+
+# Warna resmi tiap goal, dipakai untuk bar chart
+SDG_COLORS = {
+    1: "#E5243B", 2: "#DDA63A", 3: "#4C9F38", 4: "#C5192D", 5: "#FF3A21",
+    6: "#26BDE2", 7: "#FCC30B", 8: "#A21942", 9: "#FD6925", 10: "#DD1367",
+    11: "#FD9D24", 12: "#BF8B2E", 13: "#3F7E44", 14: "#0A97D9", 15: "#56C02B",
+    16: "#00689D", 17: "#19486A"
+}
+
+
+# ------------------ SDG ICON CACHE ------------------
+
+_icon_cache = {}
+_icon_lock = threading.Lock()
+
+
+def _prescale_icon(goal):
+    pixels = round(SDG_ICON_SIZE / inch * SDG_ICON_DPI)
+    path = os.path.join(SDG_ICON_DIR, f"E_SDG_Icons-{goal:02d}.jpg")
+    with PILImage.open(path) as img:
+        img = img.convert("RGB")
+        img.thumbnail((pixels, pixels), PILImage.LANCZOS)
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=90, optimize=True)
+    return out.getvalue()
+
+
+def get_sdg_icon(goal):
+    data = _icon_cache.get(goal)
+    if data is None:
+        with _icon_lock:
+            data = _icon_cache.get(goal)
+            if data is None:
+                data = _prescale_icon(goal)
+                _icon_cache[goal] = data
+    return data
+
+
+def warm_icon_cache():
+    # Dipanggil sebelum worker di-fork supaya cache terbagi lewat copy-on-write
+    for goal in SDG_NAMES:
+        get_sdg_icon(goal)
+
+
+def sdg_icon_row(sdg_ids):
+    icons = [
+        Image(BytesIO(get_sdg_icon(goal)), width=SDG_ICON_SIZE, height=SDG_ICON_SIZE)
+        for goal in sdg_ids if goal in SDG_NAMES
+    ]
+    if not icons:
+        return None
+    rows = [icons[i:i + SDG_ICONS_PER_ROW] for i in range(0, len(icons), SDG_ICONS_PER_ROW)]
+    table = Table(rows, colWidths=[SDG_ICON_SIZE + 4] * min(len(icons), SDG_ICONS_PER_ROW), hAlign="LEFT")
+    table.setStyle(TableStyle([
+        ("LEFTPADDING", (0, 0), (-1, -1), 0),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 4),
+        ("TOPPADDING", (0, 0), (-1, -1), 0),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+    ]))
+    return table
+
+
+def sdg_score_chart(sdg_scores, width=6 * inch, height=4.5 * inch):
+    scores = {}
+    for label, score in sdg_scores.items():
+        try:
+            scores[int(str(label).replace("Goal ", ""))] = float(score)
+        except ValueError:
+            continue
+
+    # HorizontalBarChart menggambar kategori dari bawah ke atas; dibalik agar Goal 1 di atas
+    goals = sorted(SDG_NAMES, reverse=True)
+
+    drawing = Drawing(width, height)
+    chart = HorizontalBarChart()
+    chart.x = 0.7 * inch
+    chart.y = 0.3 * inch
+    chart.width = width - 1.0 * inch
+    chart.height = height - 0.5 * inch
+    chart.data = [[scores.get(goal, 0.0) for goal in goals]]
+    chart.barWidth = chart.height / len(goals) * 0.7
+    chart.strokeColor = None
+    chart.bars.strokeColor = None
+    for i, goal in enumerate(goals):
+        chart.bars[(0, i)].fillColor = HexColor(SDG_COLORS[goal])
+
+    chart.categoryAxis.categoryNames = [f"Goal {goal}" for goal in goals]
+    chart.categoryAxis.labels.fontName = "ArialNova"
+    chart.categoryAxis.labels.fontSize = 8
+    chart.categoryAxis.labels.dx = -4
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.valueMax = 100
+    chart.valueAxis.valueStep = 20
+    chart.valueAxis.labels.fontName = "ArialNova"
+    chart.valueAxis.labels.fontSize = 8
+    chart.valueAxis.labelTextFormat = "%d%%"
+    chart.valueAxis.visibleGrid = True
+    chart.valueAxis.gridStrokeColor = HexColor("#DDDDDD")
+
+    drawing.add(chart)
+    return drawing
+
+
+# ------------------ PDF LAYOUT ------------------
+
+def draw_header(canvas, doc):
+    logo_path = "uploads/LOGO_SC.jpg"
+    logo_width = 2.8 * inch  
+    logo_height = logo_width * (0.55 / 2.2)  #rasio
+
+    page_width, page_height = A4
+    x = (page_width - logo_width) / 2
+    y = page_height - logo_height - 0.2 * inch
+
+    canvas.drawImage(logo_path, x, y, width=logo_width, height=logo_height, preserveAspectRatio=True)
+
+    text = "SDG Mapping and Assessment Report"
+    canvas.setFont("ArialNova-Bold", 20)  
+    text_width = canvas.stringWidth(text, "ArialNova-Bold", 20)
+    x = (page_width - text_width) / 2
+    y = page_height - 1.5 * inch
+
+    canvas.drawString(x, y, text)
+
+
+
+def draw_footer(canvas, doc):
+    footer_path = "uploads/footer.png"
+    footer_width = doc.pagesize[0]
+    footer_height = 0.9 * inch  
+
+    x = 0
+    y = 0  
+
+    canvas.drawImage(footer_path, x, y, width=footer_width, height=footer_height, preserveAspectRatio=True, mask='auto')
+
+def draw_first_page(canvas, doc):
+    draw_header(canvas, doc)
+    draw_footer(canvas, doc)
+
+
+def build_report(output, submission_id_str, submission_date_str, filename, sdg_ids, abstract, sdg_scores,
+                 visuals=True):
+    doc = SimpleDocTemplate(
+            output,
+            pagesize=A4,
+            topMargin=1* inch  # atur agar isi tidak nabrak header
+        )
+    doc.title = "SMART SDG Classifier"
+    doc.author = "https://super.universitaspertamina.ac.id/index.php/smart/"
+    styles = getSampleStyleSheet()
+
+    normal_style = styles["Normal"]
+    normal_style.fontName = "ArialNova"
+    normal_style.spaceAfter = 12
+
+    justified_style = ParagraphStyle(
+        name="Justified",
+        parent=normal_style,
+        alignment=TA_JUSTIFY,
+        fontSize=11,
+        fontName="ArialNova"
+    )
+
+    heading_style = ParagraphStyle(
+        name="Heading",
+        fontSize=14,
+        leading=16,
+        fontName="ArialNova-Bold",
+        textColor=HexColor("#31572C"),
+        alignment=TA_LEFT,
+        spaceBefore=12,
+        spaceAfter=6
+    )
+
+    elements = []
+
+    # Title
+    elements.append(Spacer(1, 42))
+
+    # General Notes
+    elements.append(Paragraph("General Notes", heading_style))
+    notes = """
+    This application performs Sustainable Development Goal (SDG) classification based on the abstract extracted from a PDF document.
+    The document is parsed using the fitz library (PyMuPDF), which allows structured reading and text extraction.<br/><br/>
+    The application first attempts to detect and extract the abstract section from the PDF. If an abstract is not detected, 
+    the fallback mechanism extracts the first 500 words from the document as a proxy for the abstract.<br/><br/>
+    The extracted text is then analyzed using the Aurora SDG multi-label mBERT model (https://aurora-sdg.labs.vu.nl/sdg-classifier/text). 
+    This model performs multi-label classification across all 17 Sustainable Development Goals (SDGs).<br/><br/>
+    The output consists of percentage scores (ranging from 0% to 100%) for each SDG, indicating the degree of relevance between the input text and each goal. 
+    Multiple SDGs can be associated with a single document depending on the model’s confidence levels.<br/><br/>
+    This abstract-based analysis enables efficient and scalable SDG classification.
+    """
+    elements.append(Paragraph(notes, justified_style))
+    elements.append(Spacer(1, 18))
+    divider_path = "uploads/divider.png"
+    img_reader = ImageReader(divider_path)
+    orig_width, orig_height = img_reader.getSize()
+
+    # Hitung ukuran baru agar lebarnya sesuai dengan lebar halaman dikurangi margin
+    margin = 1 * inch  # margin kiri + kanan = 2 inch
+    available_width = doc.pagesize[0] - margin
+
+    # Hitung rasio dan sesuaikan tinggi
+    scale = available_width / orig_width
+    new_width = available_width
+    new_height = orig_height * scale
+
+    divider = Image(divider_path, width=new_width, height=new_height)
+
+    elements.append(divider)
+    elements.append(Spacer(1, 16))
+
+    elements.append(Paragraph(
+        f"<b>Submission ID:</b> <font color='#0000FF'>{submission_id_str}</font>", justified_style))
+    elements.append(Paragraph(
+        f"<b>Submission Date:</b> <font color='#0000FF'>{submission_date_str}</font>", justified_style))
+    elements.append(Paragraph(
+        f"<b>File Name:</b> <font color='#0000FF'>{filename}</font>", justified_style))
+    
+    if not sdg_ids:
+        elements.append(Paragraph("<b>SDG Detected:</b> <font color='#0000FF'>None</font>", justified_style))
+    else:
+        sdg_texts = [f"Goal {sid} – {SDG_NAMES.get(sid, 'Unknown')}" for sid in sdg_ids]
+        sdg_line = "; ".join(sdg_texts)
+        elements.append(Paragraph(f"<b>SDG Detected:</b> <font color='#0000FF'>{sdg_line}</font>", justified_style))
+        icon_row = sdg_icon_row(sdg_ids) if visuals else None
+        if icon_row is not None:
+            elements.append(icon_row)
+
+    elements.append(Spacer(1, 18))
+
+    elements.append(PageBreak())
+
+
+    # Abstract
+    elements.append(Paragraph("Detected Abstract", heading_style))
+    elements.append(Paragraph(abstract, justified_style))
+    elements.append(Spacer(1, 18))
+
+    # SDG Classification Results
+    elements.append(Paragraph("SDG Classification Results", heading_style))
+    if visuals and sdg_scores:
+        elements.append(sdg_score_chart(sdg_scores))
+        elements.append(Spacer(1, 12))
+
+    sorted_scores = sorted(sdg_scores.items(), key=lambda x: x[1], reverse=True)
+    table_data = [["SDG", "Relevance (%)"]] + [[k, f"{v:.2f}%"] for k, v in sorted_scores]
+
+    table = Table(table_data, colWidths=[3*inch, 2*inch])
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), HexColor("#31572C")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), HexColor("#FFFFFF")),
+        ("FONTNAME", (0, 0), (-1, 0), "ArialNova-Bold"),
+        ("FONTNAME", (0, 1), (-1, -1), "ArialNova"),
+        ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
+        ("FONTSIZE", (0, 0), (-1, -1), 10),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 6),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [HexColor("#F5F5F5"), HexColor("#FFFFFF")]),
+        ("GRID", (0, 0), (-1, -1), 0.5, HexColor("#CCCCCC"))
+    ]))
+
+    elements.append(table)
+
+    doc.build(elements, onFirstPage=draw_first_page, onLaterPages=draw_footer)
+
+
+# ------------------ PROCESS POOL ------------------
+
+class ReportTimeout(Exception):
+    pass
+
+
+class ReportQueueFull(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise ReportTimeout("Report rendering exceeded the time limit")
+
+
+def discard_report(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def render_report_to_file(submitted_at, *args):
+    # Jalan di worker process; PDF ditulis ke file sementara supaya byte-nya tidak perlu di-pickle
+    started_at = time.time()
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, REPORT_RENDER_TIMEOUT)
+
+    fd, path = tempfile.mkstemp(prefix="sdg_report_", suffix=".pdf", dir=REPORT_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as output:
+            build_report(output, *args)
+    except BaseException:
+        os.remove(path)
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    return path, started_at - submitted_at, time.time() - started_at
+
+
+class ReportRenderer:
+    def __init__(self, workers=REPORT_WORKERS, queue_size=REPORT_QUEUE_SIZE, timeout=REPORT_RENDER_TIMEOUT):
+        self.timeout = timeout
+        self.workers = workers
+        warm_icon_cache()
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        # Slot = render yang sedang jalan + yang antre; permintaan di luar itu langsung ditolak
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.metrics = {
+            "workers": workers,
+            "queue_size": queue_size,
+            "rendered": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "pool_restarts": 0,
+            "queue_wait_last": 0.0,
+            "queue_wait_max": 0.0,
+            "queue_wait_total": 0.0,
+            "render_time_total": 0.0,
+        }
+
+    def _record(self, **updates):
+        with self._lock:
+            for key, value in updates.items():
+                self.metrics[key] += value
+
+    def _restart_pool(self, broken):
+        # Worker yang mati (OOM killer, segfault di library C) membuat pool rusak permanen
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.metrics["pool_restarts"] += 1
+        broken.shutdown(wait=False)
+        logging.warning("⚠️ Pool render report rusak, dibuat ulang")
+
+    def _submit(self, *args):
+        executor = self._executor
+        try:
+            return executor, executor.submit(render_report_to_file, time.time(), *args)
+        except BrokenProcessPool:
+            self._restart_pool(executor)
+            executor = self._executor
+            return executor, executor.submit(render_report_to_file, time.time(), *args)
+
+    def _on_done(self, future, abandoned):
+        self._slots.release()
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        path, queue_wait, render_time = future.result()
+        with self._lock:
+            self.metrics["queue_wait_last"] = queue_wait
+            self.metrics["queue_wait_max"] = max(self.metrics["queue_wait_max"], queue_wait)
+        if abandoned.is_set():
+            # Handler sudah menyerah menunggu; file hasil tidak akan pernah dikirim
+            discard_report(path)
+
+    def render(self, *args):
+        if not self._slots.acquire(blocking=False):
+            self._record(rejected=1)
+            raise ReportQueueFull("Too many reports are being rendered, try again later")
+
+        abandoned = threading.Event()
+        try:
+            executor, future = self._submit(*args)
+        except Exception:
+            self._slots.release()
+            self._record(errors=1)
+            raise
+        future.add_done_callback(lambda f: self._on_done(f, abandoned))
+
+        try:
+            # Sedikit kelonggaran di atas batas worker untuk waktu antre
+            path, queue_wait, render_time = future.result(timeout=self.timeout * 2)
+        except (FutureTimeoutError, ReportTimeout):
+            abandoned.set()
+            # Render yang masih antre dibatalkan; yang sudah jalan dihentikan SIGALRM di worker
+            future.cancel()
+            if future.done() and not future.cancelled() and future.exception() is None:
+                discard_report(future.result()[0])
+            self._record(timeouts=1)
+            raise ReportTimeout("Report rendering exceeded the time limit")
+        except BrokenProcessPool:
+            self._restart_pool(executor)
+            self._record(errors=1)
+            raise
+        except Exception:
+            self._record(errors=1)
+            raise
+
+        self._record(rendered=1, queue_wait_total=queue_wait, render_time_total=render_time)
+        logging.info(f"📄 Report dirender dalam {render_time:.2f}s (antre {queue_wait:.2f}s)")
+        return path
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.metrics)
+        rendered = data["rendered"] or 1
+        data["queue_wait_avg"] = data.pop("queue_wait_total") / rendered
+        data["render_time_avg"] = data.pop("render_time_total") / rendered
+        return data
+
+
+renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    # Dipanggil sekali saat startup app; lock mencegah dua pool dibuat oleh thread request
+    global renderer
+    with _renderer_lock:
+        if renderer is None:
+            renderer = ReportRenderer()
+    return renderer
+
+
+def renderer_snapshot():
+    # /metrics tidak boleh ikut menyalakan pool
+    return renderer.snapshot() if renderer is not None else None
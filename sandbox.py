@@ -0,0 +1,222 @@
+import os
+import queue
+import signal
+import logging
+import resource
+import threading
+import multiprocessing
+
+from pipeline import extract_text_from_pdf, ExtractionError
+
+# Mode ekstraksi terisolasi: tiap dokumen diproses di worker dengan batas memori dan CPU
+EXTRACT_SANDBOX = os.getenv("EXTRACT_SANDBOX", "0") == "1"
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+EXTRACT_MAX_MEMORY_MB = int(os.getenv("EXTRACT_MAX_MEMORY_MB", "1024"))
+EXTRACT_MAX_CPU_SECONDS = int(os.getenv("EXTRACT_MAX_CPU_SECONDS", "30"))
+EXTRACT_WALL_TIMEOUT = float(os.getenv("EXTRACT_WALL_TIMEOUT", str(EXTRACT_MAX_CPU_SECONDS * 2)))
+EXTRACT_MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "300"))
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "2000000"))
+EXTRACT_RECYCLE_AFTER = int(os.getenv("EXTRACT_RECYCLE_AFTER", "50"))
+
+
+class CpuTimeExceeded(Exception):
+    pass
+
+
+# ------------------ WORKER PROCESS ------------------
+
+def _raise_cpu_exceeded(signum, frame):
+    raise CpuTimeExceeded()
+
+
+def _proc_status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_kb():
+    # VmHWM bisa di-reset per dokumen lewat clear_refs; ru_maxrss hanya sebagai cadangan
+    peak = _proc_status_kb("VmHWM")
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _extract_one(pdf_path):
+    _reset_peak_rss()
+    # RLIMIT_CPU bersifat kumulatif per proses, jadi batas soft digeser untuk tiap dokumen
+    cpu_limit = int(_cpu_seconds()) + EXTRACT_MAX_CPU_SECONDS
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, resource.RLIM_INFINITY))
+    try:
+        text = extract_text_from_pdf(pdf_path, max_pages=EXTRACT_MAX_PAGES, max_chars=EXTRACT_MAX_CHARS)
+        return {"status": "success", "text": text, "peak_rss_kb": _peak_rss_kb()}
+    except MemoryError:
+        error = {"type": "memory_limit", "message": f"Document exceeded {EXTRACT_MAX_MEMORY_MB} MB"}
+    except CpuTimeExceeded:
+        error = {"type": "cpu_limit", "message": f"Document exceeded {EXTRACT_MAX_CPU_SECONDS}s of CPU time"}
+    except Exception as e:
+        # MuPDF melaporkan kegagalan alokasi sebagai exception biasa
+        error_type = "memory_limit" if "malloc" in str(e).lower() or "memory" in str(e).lower() else "extraction_error"
+        error = {"type": error_type, "message": str(e)}
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+    return {"status": "error", "error": error, "peak_rss_kb": _peak_rss_kb()}
+
+
+def _worker_main(conn):
+    # Worker di-fork dari proses Flask sehingga mewarisi address space-nya (thread stack, pool,
+    # library); batas dihitung di atas VmSize saat ini agar tiap dokumen benar-benar dapat
+    # EXTRACT_MAX_MEMORY_MB. forkserver/spawn tidak dipakai karena akan mengeksekusi ulang app.py
+    inherited = (_proc_status_kb("VmSize") or 0) * 1024
+    limit = inherited + EXTRACT_MAX_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    signal.signal(signal.SIGXCPU, _raise_cpu_exceeded)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    while True:
+        try:
+            pdf_path = conn.recv()
+        except EOFError:
+            return
+        if pdf_path is None:
+            return
+        conn.send(_extract_one(pdf_path))
+
+
+# ------------------ PARENT SIDE ------------------
+
+class SandboxWorker:
+    def __init__(self, context):
+        self._context = context
+        self.process = None
+        self.conn = None
+        self.tasks = 0
+        self.start()
+
+    def start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.tasks = 0
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def run(self, pdf_path, timeout):
+        self.tasks += 1
+        try:
+            self.conn.send(pdf_path)
+            if not self.conn.poll(timeout):
+                self.stop(kill=True)
+                self.start()
+                return {"status": "error", "error": {
+                    "type": "timeout", "message": f"Extraction took longer than {timeout:.0f}s"}}
+            return self.conn.recv()
+        except (EOFError, BrokenPipeError, OSError):
+            # Worker mati di tengah jalan (mis. dibunuh OOM killer atau crash di library C)
+            exitcode = self.process.exitcode
+            self.stop(kill=True)
+            self.start()
+            return {"status": "error", "error": {
+                "type": "worker_crashed", "message": f"Extraction worker died (exit code {exitcode})"}}
+
+
+class ExtractionSandbox:
+    def __init__(self, workers=EXTRACT_WORKERS, recycle_after=EXTRACT_RECYCLE_AFTER, timeout=EXTRACT_WALL_TIMEOUT):
+        self.recycle_after = recycle_after
+        self.timeout = timeout
+        context = multiprocessing.get_context("fork")
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(SandboxWorker(context))
+
+        self._lock = threading.Lock()
+        self.metrics = {
+            "workers": workers,
+            "documents": 0,
+            "errors": {},
+            "recycled": 0,
+            "peak_rss_kb_last": 0,
+            "peak_rss_kb_max": 0,
+            "peak_rss_kb_total": 0,
+        }
+
+    def _record(self, result):
+        with self._lock:
+            self.metrics["documents"] += 1
+            peak = result.get("peak_rss_kb") or 0
+            self.metrics["peak_rss_kb_last"] = peak
+            self.metrics["peak_rss_kb_max"] = max(self.metrics["peak_rss_kb_max"], peak)
+            self.metrics["peak_rss_kb_total"] += peak
+            if result["status"] != "success":
+                error_type = result["error"]["type"]
+                self.metrics["errors"][error_type] = self.metrics["errors"].get(error_type, 0) + 1
+
+    def extract_text(self, pdf_path):
+        worker = self._idle.get()
+        try:
+            result = worker.run(os.path.abspath(pdf_path), self.timeout)
+            if worker.tasks >= self.recycle_after:
+                # Membatasi kebocoran memori di library C dengan mengganti worker secara berkala
+                worker.stop()
+                worker.start()
+                with self._lock:
+                    self.metrics["recycled"] += 1
+        finally:
+            self._idle.put(worker)
+
+        self._record(result)
+        logging.debug(f"🧪 Ekstraksi {pdf_path}: {result['status']}, peak RSS {result.get('peak_rss_kb')} kB")
+        if result["status"] != "success":
+            error = result["error"]
+            raise ExtractionError(error["type"], error["message"], peak_rss_kb=result.get("peak_rss_kb"))
+        return result["text"]
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.metrics, errors=dict(self.metrics["errors"]))
+        data["peak_rss_kb_avg"] = data.pop("peak_rss_kb_total") / (data["documents"] or 1)
+        return data
+
+
+sandbox = None
+
+
+def get_text_extractor():
+    # None berarti ekstraksi biasa di proses yang sama
+    global sandbox
+    if not EXTRACT_SANDBOX:
+        return None
+    if sandbox is None:
+        sandbox = ExtractionSandbox()
+    return sandbox.extract_text
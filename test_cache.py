@@ -0,0 +1,130 @@
+import zlib
+
+import pytest
+
+import cache
+from cache import Cache, DictClient, LocalMemoryBackend, NetworkBackend, SQLiteBackend, encode_value, decode_value
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, "time", fake)
+    return fake
+
+
+def test_encode_roundtrip_json_and_bytes():
+    big = {"abstract": "x" * 5000, "scores": {"Goal 7": 91.4}}
+    assert decode_value(encode_value(big)) == big
+    assert encode_value(big)[:1] == b"j"
+    assert decode_value(encode_value(b"%PDF-1.4")) == b"%PDF-1.4"
+    assert decode_value(encode_value(b"\0" * 4096))[:1] == b"\0"
+
+
+def test_memory_backend_expires_entries(clock):
+    backend = LocalMemoryBackend()
+    backend.set("k", b"value", ttl=10)
+    clock.now += 9
+    assert backend.get("k") == b"value"
+    clock.now += 2
+    assert backend.get("k") is None
+    assert backend._bytes == 0
+
+
+def test_memory_backend_evicts_lru_by_bytes():
+    backend = LocalMemoryBackend(max_entries=100, max_bytes=800)
+    for i in range(8):
+        backend.set(str(i), b"x" * 100, ttl=60)
+    # Entri "0" dibaca sehingga menjadi yang paling baru dipakai
+    assert backend.get("0") is not None
+    backend.set("8", b"x" * 100, ttl=60)
+
+    assert backend.get("0") is not None
+    assert backend.get("1") is None
+    assert backend._bytes <= 800
+    assert backend._bytes == sum(len(blob) for _, blob in backend._entries.values())
+
+
+def test_memory_backend_replacing_key_keeps_byte_count():
+    backend = LocalMemoryBackend(max_entries=100, max_bytes=800)
+    backend.set("k", b"x" * 90, ttl=60)
+    backend.set("k", b"y" * 10, ttl=60)
+    assert backend._bytes == 10
+
+
+def test_memory_backend_skips_oversized_entries():
+    backend = LocalMemoryBackend(max_entries=100, max_bytes=800)
+    backend.set("small", b"x" * 50, ttl=60)
+    backend.set("big", b"x" * 101, ttl=60)
+    assert backend.get("big") is None
+    assert backend.get("small") is not None
+
+
+def test_memory_backend_bounded_by_entry_count():
+    backend = LocalMemoryBackend(max_entries=3, max_bytes=10_000)
+    for i in range(5):
+        backend.set(str(i), b"v", ttl=60)
+    assert len(backend._entries) == 3
+    assert backend.get("0") is None
+
+
+def test_network_backend_with_dict_client_expires():
+    clock = FakeClock()
+    c = Cache(NetworkBackend(DictClient(clock=clock)), ttls={"aurora": 30})
+    c.set("aurora", "abstract", {"model": "elsevier-sdg-multi", "scores": {"Goal 7": 91.4}})
+    assert c.get("aurora", "abstract")["model"] == "elsevier-sdg-multi"
+    clock.now += 31
+    assert c.get("aurora", "abstract") is None
+
+
+def test_sqlite_backend_roundtrip_and_expiry(tmp_path, clock):
+    c = Cache(SQLiteBackend(str(tmp_path / "cache.sqlite3")), ttls={"report": 60})
+    c.set("report", ["00001", "paper"], b"%PDF-1.4 report")
+    assert c.get("report", ["00001", "paper"]) == b"%PDF-1.4 report"
+    clock.now += 61
+    assert c.get("report", ["00001", "paper"]) is None
+
+
+@pytest.mark.parametrize("blob", [
+    b"j" + b"not zlib at all",
+    b"J" + b"{broken json",
+    b"b" + zlib.compress(b"payload")[:-4],
+])
+def test_corrupt_entry_counts_as_error_and_miss(blob):
+    c = Cache(LocalMemoryBackend())
+    c.backend.set(c._key("aurora", "k"), blob, ttl=60)
+
+    assert c.get("aurora", "k") is None
+    stats = c.stats()["namespaces"]["aurora"]
+    assert stats["errors"] == 1
+    assert stats["misses"] == 1
+    assert stats["hits"] == 0
+
+
+def test_backend_failure_is_a_miss():
+    class BrokenClient:
+        def get(self, key):
+            raise ConnectionError("down")
+
+        def set(self, key, value, ex=None):
+            raise ConnectionError("down")
+
+    c = Cache(NetworkBackend(BrokenClient()))
+    c.set("geo", "1.2.3.4", {"city": "Jakarta"})
+    assert c.get("geo", "1.2.3.4") is None
+    stats = c.stats()["namespaces"]["geo"]
+    assert (stats["errors"], stats["misses"], stats["sets"]) == (2, 1, 0)
+
+
+def test_stats_are_per_process():
+    stats = Cache(LocalMemoryBackend()).stats()
+    assert stats["scope"] == "process"
+    assert stats["backend"] == "LocalMemoryBackend"
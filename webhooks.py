@@ -0,0 +1,310 @@
+import os
+import hmac
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from psycopg2.extras import Json
+
+from insight_db import get_connection, get_location_str, insert_upload
+from pipeline import process_single_pdf, detected_sdgs
+from sandbox import get_text_extractor
+
+# Konfigurasi pemrosesan webhook dan pengiriman callback
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "5"))
+WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", "600"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "10"))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", "3600"))
+WEBHOOK_HTTP_TIMEOUT = float(os.getenv("WEBHOOK_HTTP_TIMEOUT", "30"))
+WEBHOOK_DEFAULT_CALLBACK_URL = os.getenv("WEBHOOK_CALLBACK_URL")
+
+# Rahasia bersama dengan Forminator; tanpa ini endpoint webhook menolak semua request
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Host (dipisah koma) yang boleh dipakai sebagai callback_url dan sumber file_url
+WEBHOOK_CALLBACK_ALLOWLIST = {h.strip().lower() for h in os.getenv("WEBHOOK_CALLBACK_ALLOWLIST", "").split(",") if h.strip()}
+WEBHOOK_FILE_ALLOWLIST = {h.strip().lower() for h in os.getenv("WEBHOOK_FILE_ALLOWLIST", "").split(",") if h.strip()}
+WEBHOOK_MAX_DOWNLOAD_BYTES = int(os.getenv("WEBHOOK_MAX_DOWNLOAD_BYTES", str(50 * 1024 * 1024)))
+
+DELIVERY_COLUMNS = (
+    "id, idempotency_key, status, filename, file_url, file_path, ip, callback_url, "
+    "submission_id, result, attempts, last_error"
+)
+
+# status: pending -> delivering -> delivered | completed (tanpa callback) | failed
+_executor = ThreadPoolExecutor(max_workers=WEBHOOK_WORKERS, thread_name_prefix="webhook")
+_dispatcher = None
+
+
+def _row_to_delivery(row):
+    return dict(zip([c.strip() for c in DELIVERY_COLUMNS.split(",")], row))
+
+
+# ------------------ VALIDASI ------------------
+
+def verify_request(body, headers):
+    # X-Webhook-Signature: sha256=<HMAC-SHA256 body>, atau X-Webhook-Token berisi rahasia itu sendiri
+    # untuk pengirim yang hanya bisa menambah header statis
+    if not WEBHOOK_SECRET:
+        return False
+    signature = headers.get("X-Webhook-Signature", "")
+    if signature:
+        expected = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature.removeprefix("sha256="), expected)
+    return hmac.compare_digest(headers.get("X-Webhook-Token", ""), WEBHOOK_SECRET)
+
+
+def _host_allowed(url, allowlist):
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and (parsed.hostname or "").lower() in allowlist
+
+
+def callback_allowed(url):
+    return url == WEBHOOK_DEFAULT_CALLBACK_URL or _host_allowed(url, WEBHOOK_CALLBACK_ALLOWLIST)
+
+
+def file_url_allowed(url):
+    return _host_allowed(url, WEBHOOK_FILE_ALLOWLIST)
+
+
+# ------------------ DATABASE ------------------
+
+def create_delivery(idempotency_key, filename, file_url, file_path, ip, callback_url):
+    # Lease awal mencegah dispatcher mengambil baris yang sedang diproses oleh intake
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO webhook_deliveries
+                    (idempotency_key, status, filename, file_url, file_path, ip, callback_url, next_attempt_at)
+                VALUES (%s, 'pending', %s, %s, %s, %s, %s, now() + %s * interval '1 second')
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING {DELIVERY_COLUMNS}
+                """,
+                (idempotency_key, filename, file_url, file_path, ip, callback_url, WEBHOOK_LEASE_SECONDS)
+            )
+            row = cursor.fetchone()
+        conn.commit()
+    return _row_to_delivery(row) if row else None
+
+
+def get_delivery(idempotency_key):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {DELIVERY_COLUMNS} FROM webhook_deliveries WHERE idempotency_key = %s",
+                (idempotency_key,)
+            )
+            row = cursor.fetchone()
+    return _row_to_delivery(row) if row else None
+
+
+def _update_delivery(delivery_id, **fields):
+    assignments = ", ".join(f"{key} = %s" for key in fields)
+    values = [Json(v) if key == "result" else v for key, v in fields.items()]
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE webhook_deliveries SET {assignments}, updated_at = now() WHERE id = %s",
+                values + [delivery_id]
+            )
+        conn.commit()
+
+
+def _schedule_retry(delivery, error):
+    attempts = delivery["attempts"] + 1
+    if attempts >= WEBHOOK_MAX_ATTEMPTS:
+        logging.error(f"❌ Webhook {delivery['idempotency_key']} gagal setelah {attempts} percobaan: {error}")
+        _update_delivery(delivery["id"], status="failed", attempts=attempts, last_error=error)
+        if delivery["file_path"] and os.path.exists(delivery["file_path"]):
+            os.remove(delivery["file_path"])
+        return
+
+    delay = min(WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1), WEBHOOK_BACKOFF_MAX)
+    delay *= random.uniform(0.8, 1.2)
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE webhook_deliveries
+                SET attempts = %s, last_error = %s, updated_at = now(),
+                    next_attempt_at = now() + %s * interval '1 second'
+                WHERE id = %s
+                """,
+                (attempts, error, delay, delivery["id"])
+            )
+        conn.commit()
+    logging.warning(f"⚠️ Webhook {delivery['idempotency_key']} dicoba lagi dalam {delay:.0f}s: {error}")
+
+
+def _claim_due_deliveries(limit=20):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE webhook_deliveries
+                SET next_attempt_at = now() + %s * interval '1 second', updated_at = now()
+                WHERE id IN (
+                    SELECT id FROM webhook_deliveries
+                    WHERE status IN ('pending', 'delivering') AND next_attempt_at <= now()
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING {DELIVERY_COLUMNS}
+                """,
+                (WEBHOOK_LEASE_SECONDS, limit)
+            )
+            rows = cursor.fetchall()
+        conn.commit()
+    return [_row_to_delivery(row) for row in rows]
+
+
+# ------------------ PROCESSING ------------------
+
+def _download(file_url, dest_path):
+    if not file_url_allowed(file_url):
+        raise RuntimeError("File URL host is not allowed")
+    # Redirect tidak diikuti supaya allowlist tidak bisa dilewati
+    with requests.get(file_url, timeout=WEBHOOK_HTTP_TIMEOUT, stream=True, allow_redirects=False) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to download file: HTTP {response.status_code}")
+        if int(response.headers.get("Content-Length") or 0) > WEBHOOK_MAX_DOWNLOAD_BYTES:
+            raise RuntimeError(f"File is larger than {WEBHOOK_MAX_DOWNLOAD_BYTES} bytes")
+        size = 0
+        with open(dest_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size > WEBHOOK_MAX_DOWNLOAD_BYTES:
+                    raise RuntimeError(f"File is larger than {WEBHOOK_MAX_DOWNLOAD_BYTES} bytes")
+                f.write(chunk)
+
+
+def _record_submission(delivery, result, sdg_list, status):
+    # Baris uploads_new dan status delivery ditulis dalam satu transaksi: retry setelah gagal
+    # tidak pernah menemukan submission yang sudah tersimpan tetapi delivery masih 'pending'
+    location_str = get_location_str(delivery["ip"])
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            submission_id = insert_upload(
+                cursor, delivery["filename"], delivery["ip"], location_str, sdg_list,
+                abstract=result.get("abstract"), sdg_scores=result.get("sdg"), sdg_model=result.get("sdg_model")
+            )
+            result["submission_id"] = submission_id
+            cursor.execute(
+                """
+                UPDATE webhook_deliveries
+                SET status = %s, submission_id = %s, result = %s, updated_at = now()
+                WHERE id = %s AND status = 'pending'
+                """,
+                (status, submission_id, Json(result), delivery["id"])
+            )
+            if cursor.rowcount == 0:
+                # Worker lain sudah menyelesaikan delivery ini; submission ganda dibatalkan
+                conn.rollback()
+                return None
+        conn.commit()
+    return submission_id
+
+
+def _process(delivery, upload_folder):
+    path = delivery["file_path"] or os.path.join(upload_folder, f"webhook_{delivery['id']}.pdf")
+    try:
+        if not delivery["file_path"]:
+            _download(delivery["file_url"], path)
+        elif not os.path.exists(path):
+            raise RuntimeError("Uploaded file is no longer available")
+        result = process_single_pdf(path, extract_text=get_text_extractor())
+
+        sdg_list = detected_sdgs(result.get("sdg", {})) if result.get("status") == "success" else []
+        result["sdg_detected"] = sdg_list
+        status = "delivering" if delivery["callback_url"] else "completed"
+        submission_id = _record_submission(delivery, result, sdg_list, status)
+    except Exception as e:
+        # File upload disimpan untuk retry; hasil unduhan cukup diunduh ulang
+        if not delivery["file_path"] and os.path.exists(path):
+            os.remove(path)
+        _schedule_retry(delivery, str(e))
+        return None
+
+    # File baru dihapus setelah delivery tercatat selesai diproses
+    if os.path.exists(path):
+        os.remove(path)
+    if submission_id is None:
+        return None
+    delivery.update(status=status, submission_id=submission_id, result=result)
+    return delivery
+
+
+def _deliver(delivery):
+    payload = {
+        "idempotency_key": delivery["idempotency_key"],
+        "delivery_id": delivery["id"],
+        "filename": delivery["filename"],
+        **delivery["result"],
+    }
+    if not callback_allowed(delivery["callback_url"]):
+        # Allowlist bisa berubah sejak delivery dibuat
+        logging.error(f"❌ Callback webhook {delivery['idempotency_key']} tidak diizinkan: {delivery['callback_url']}")
+        _update_delivery(delivery["id"], status="failed", last_error="Callback URL is not allowed")
+        return
+
+    body = json.dumps(payload).encode()
+    headers = {"Idempotency-Key": delivery["idempotency_key"], "Content-Type": "application/json"}
+    if WEBHOOK_SECRET:
+        headers["X-Webhook-Signature"] = "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    try:
+        response = requests.post(
+            delivery["callback_url"], data=body, timeout=WEBHOOK_HTTP_TIMEOUT,
+            headers=headers, allow_redirects=False
+        )
+        if not 200 <= response.status_code < 300:
+            raise RuntimeError(f"Callback returned HTTP {response.status_code}")
+    except Exception as e:
+        _schedule_retry(delivery, str(e))
+        return
+
+    _update_delivery(delivery["id"], status="delivered", attempts=delivery["attempts"] + 1, last_error=None)
+    logging.info(f"📤 Hasil webhook {delivery['idempotency_key']} terkirim ke {delivery['callback_url']}")
+
+
+def handle_delivery(delivery, upload_folder):
+    try:
+        if delivery["status"] == "pending":
+            delivery = _process(delivery, upload_folder)
+        if delivery and delivery["status"] == "delivering":
+            _deliver(delivery)
+    except Exception as e:
+        # Lease akan habis dan dispatcher mengambil ulang baris ini
+        logging.error(f"❌ Error memproses webhook {delivery['idempotency_key']}: {str(e)}")
+
+
+def submit_delivery(delivery, upload_folder):
+    _executor.submit(handle_delivery, delivery, upload_folder)
+
+
+def _dispatch_loop(upload_folder):
+    while True:
+        try:
+            for delivery in _claim_due_deliveries():
+                submit_delivery(delivery, upload_folder)
+        except Exception as e:
+            logging.error(f"❌ Dispatcher webhook error: {str(e)}")
+        time.sleep(WEBHOOK_POLL_INTERVAL)
+
+
+def start_webhook_dispatcher(upload_folder):
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = threading.Thread(
+            target=_dispatch_loop, args=(upload_folder,), name="webhook-dispatcher", daemon=True
+        )
+        _dispatcher.start()
+    return _dispatcher